@@ -9,10 +9,12 @@ from streamlit.components.v1 import html
 from datetime import datetime
 import io
 
+from jobs import JobManager, QueueFullError
+from metrics import TRACER
+
 # --- REWRITER AND TTS LOGIC ---
-# This now imports the hybrid function
-from rewriter import hybrid_rewrite
-from tts import synthesize
+# rewriter, tts and pipeline pull in torch/transformers, so they are imported
+# lazily inside the functions below; the page renders before they load.
 
 # ------------------ PAGE CONFIG ------------------
 st.set_page_config(
@@ -25,6 +27,9 @@ st.set_page_config(
 # ------------------ SETTINGS ------------------
 BANNER_IMAGES = ["slide.jpg", "slide2.jpg", "Background.png"]
 SLIDESHOW_DELAY = 4000  # 4 seconds
+JOB_POLL_INTERVAL = 0.5  # seconds between reruns while a background job is running
+WARMUP_LLM = os.environ.get("ECHOVERSE_WARMUP_LLM", "1") != "0"  # also preload the rewrite LLM at startup
+REWRITE_SEED = 0  # fixed seed so repeated rewrites are reproducible and served from cache
 
 # ------------------ UTILITIES ------------------
 def file_to_base64(path: str) -> str:
@@ -35,6 +40,11 @@ def file_to_base64(path: str) -> str:
     except Exception:
         return ""
 
+def audio_format():
+    """MIME type and file extension of generated audio (ECHOVERSE_AUDIO_FORMAT)"""
+    from encoders import audio_extension, audio_mime
+    return audio_mime(), audio_extension()
+
 def get_placeholder_audio_bytes():
     """Returns a placeholder audio file for demonstration."""
     sample_path = "sample.mp3"
@@ -85,40 +95,160 @@ def trigger_mega_confetti():
     """
     html(confetti_js, height=0, width=0)
 
-# --- INTEGRATING YOUR AI FUNCTIONS ---
-def rewrite_text_with_llm(text: str, tone: str) -> str:
+# ------------------ MODEL WARM-UP ------------------
+@st.cache_resource(show_spinner=False)
+def start_model_warmup() -> dict:
     """
-    This function now calls the hybrid rewriter to choose the best method.
+    Loads the VITS voice model and the rewrite LLM in a background thread,
+    once per server process. The returned status dict is shared by all sessions.
     """
-    if not text or not text.strip():
-        return ""
-    
-    with st.spinner(f"⏳ Processing with hybrid rewriter for '{tone}' tone..."):
+    status = {"🎤 Voice model": "loading", "🧠 Rewrite model": "loading" if WARMUP_LLM else "on demand"}
+
+    def warm_up():
         try:
-            rewritten = hybrid_rewrite(text, tone)
-            st.success(f"✨ Text successfully transformed with {tone} tone!")
-            return rewritten
+            import tts
+            tts.load_hf_model()
+            status["🎤 Voice model"] = "ready"
         except Exception as e:
-            st.error(f"Rewriting error: {str(e)}")
-            return text
+            print(f"Voice model warm-up failed: {e}")
+            status["🎤 Voice model"] = "unavailable"
 
-def text_to_speech(text: str, voice: str) -> bytes:
-    """
-    Calls the synthesize function from your tts.py script and
-    reads the resulting file into bytes for Streamlit.
-    """
-    with st.spinner(f"⏳ Converting text to speech with voice '{voice}'..."):
+        if not WARMUP_LLM:
+            return
         try:
-            audio_path = synthesize(text, voice)
-            if os.path.exists(audio_path):
-                with open(audio_path, "rb") as f:
-                    audio_bytes = f.read()
-                return audio_bytes
-            else:
-                return None
+            import rewriter
+            rewriter.load_llm()
+            status["🧠 Rewrite model"] = "ready"
         except Exception as e:
-            st.error(f"Error during text-to-speech conversion: {e}")
-            return None
+            print(f"Rewrite model warm-up failed: {e}")
+            status["🧠 Rewrite model"] = "unavailable"
+
+    threading.Thread(target=warm_up, name="model-warmup", daemon=True).start()
+    return status
+
+def render_model_status(status: dict):
+    """Show model readiness in the sidebar"""
+    icons = {"ready": "🟢", "loading": "🟡", "on demand": "⚪", "unavailable": "🔴"}
+    lines = "".join(
+        f'<p style="margin: 4px 0;">{icons.get(state, "⚪")} {name}: {state}</p>'
+        for name, state in status.items()
+    )
+    st.sidebar.markdown(
+        f'<div class="modern-card" style="padding: 15px; font-size: 14px;">{lines}</div>',
+        unsafe_allow_html=True
+    )
+
+# --- INTEGRATING YOUR AI FUNCTIONS ---
+def render_text_card(view, text: str):
+    """Render text inside a modern card into a Streamlit placeholder."""
+    view.markdown(f'<div class="modern-card"><p class="text-content">{text}</p></div>', unsafe_allow_html=True)
+
+# ------------------ BACKGROUND JOBS ------------------
+@st.cache_resource(show_spinner=False)
+def get_job_manager():
+    """One job manager (and worker pool) per server process, shared by all sessions."""
+    return JobManager()
+
+def poll_job(job_id: str, status_area, view) -> bool:
+    """
+    Renders a background job's progress, partial rewrite and first audio
+    segment. When the job has finished, its results move into session state.
+    Returns True while the job is still queued or running.
+    """
+    job = get_job_manager().get(job_id)
+    if job is None:
+        st.session_state.job_id = None
+        return False
+    
+    snap = job.snapshot()
+    with status_area:
+        if snap["status"] in ("queued", "running"):
+            label = "⏳ Waiting for a free worker..." if snap["status"] == "queued" else "⏳ Rewriting and narrating..."
+            if snap["kind"] == "audiobook" and snap["current_chapter"]:
+                label = f"📚 Narrating {snap['current_chapter']}..."
+            st.progress(snap["progress"], text=label)
+            if snap["rewritten_text"]:
+                render_text_card(view, snap["rewritten_text"] + " ▌")
+            if snap["audio_segments"]:
+                st.audio(snap["audio_segments"][0], format=audio_format()[0])
+            return True
+        
+        st.session_state.job_id = None
+        # The results now live in session state; let the manager drop its copy.
+        get_job_manager().release(job_id)
+        if snap["status"] == "done" and snap["kind"] == "audiobook":
+            st.session_state.audiobook = {"path": snap["output_path"], "chapters": snap["chapters"]}
+            st.session_state.audio_bytes = None
+            st.success(f"📚 Audiobook ready: {len(snap['chapters'])} chapters")
+            st.balloons()
+        elif snap["status"] == "done" and snap["audio_segments"]:
+            st.session_state.rewritten_text = snap["rewritten_text"]
+            st.session_state.audio_bytes = b"".join(snap["audio_segments"])
+            st.session_state.audiobook = None
+            st.success("🎶 Audio Generation Complete!")
+            trigger_mega_confetti()
+            st.balloons()
+        else:
+            st.error(f"❌ Audio generation failed: {snap['error'] or 'no audio was produced'}")
+    return False
+
+def render_audiobook_panel(book: dict):
+    """Player, download and chapter list for a finished audiobook (read from disk, not session state)."""
+    mime, ext = audio_format()
+    st.audio(book["path"], format=mime)
+    with open(book["path"], "rb") as f:
+        st.download_button(f"📥 Download Audiobook {ext[1:].upper()}", data=f, file_name=os.path.basename(book["path"]), mime=mime)
+    
+    start = 0.0
+    for i, chapter in enumerate(book["chapters"], 1):
+        minutes, seconds = divmod(int(start), 60)
+        st.markdown(f"**{i}. {chapter['title']}** · starts {minutes}:{seconds:02d} · {chapter['duration_s'] / 60:.1f} min")
+        start += chapter["duration_s"]
+
+# ------------------ LATENCY METRICS ------------------
+def render_latency_panel():
+    """Per-stage latency percentiles, batching gauges and recent request traces, with metrics downloads"""
+    st.markdown("### ⏱ Pipeline Latency")
+    summary = TRACER.summary()
+    if not summary:
+        st.markdown(
+            '<div class="modern-card" style="text-align: center; padding: 30px;"><p style="color: rgba(255,255,255,0.7); font-size: 18px;">⏱ Stage timings will appear here after the first request...</p></div>',
+            unsafe_allow_html=True
+        )
+        return
+    
+    st.dataframe(
+        [{"Stage": stage, **row} for stage, row in summary.items()],
+        use_container_width=True,
+        hide_index=True,
+    )
+    
+    gauges = TRACER.gauges()
+    if gauges:
+        st.markdown("#### 📦 Batching")
+        st.dataframe(
+            [{"Source": name, **values} for name, values in gauges.items()],
+            use_container_width=True,
+            hide_index=True,
+        )
+    
+    traces = TRACER.recent_traces(5)
+    if traces:
+        st.markdown("#### 🕒 Recent Requests")
+        for trace in traces:
+            started = datetime.fromtimestamp(trace["started_at"]).strftime("%H:%M:%S")
+            with st.expander(f"{started} · {trace['name']} · {trace['duration_ms']:.0f} ms"):
+                st.dataframe(
+                    [{"Stage": stage, "ms": ms} for stage, ms in trace["spans"]],
+                    use_container_width=True,
+                    hide_index=True,
+                )
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("⬇ Metrics (JSON)", TRACER.to_json(), file_name="echoverse_metrics.json", mime="application/json")
+    with col2:
+        st.download_button("⬇ Metrics (Prometheus)", TRACER.to_prometheus(), file_name="echoverse_metrics.prom", mime="text/plain")
 
 # ------------------ MODERN ENHANCED STYLES ------------------
 def apply_modern_styles():
@@ -339,6 +469,9 @@ def apply_modern_styles():
 
 # ------------------ MAIN APPLICATION ------------------
 def main():
+    # Start loading models in the background before anything else renders
+    model_status = start_model_warmup()
+    
     # Apply modern styles
     apply_modern_styles()
     
@@ -376,6 +509,8 @@ def main():
         unsafe_allow_html=True
     )
     
+    render_model_status(model_status)
+    
     uploaded_file = st.sidebar.file_uploader("📄 Upload Text File", type=["txt"])
     input_text = st.sidebar.text_area("✏ Paste Your Text", height=150, placeholder="Paste your amazing content here...")
     
@@ -392,37 +527,18 @@ def main():
         st.session_state.rewritten_text = ""
     if 'audio_bytes' not in st.session_state:
         st.session_state.audio_bytes = None
+    if 'job_id' not in st.session_state:
+        st.session_state.job_id = None
+    if 'audiobook' not in st.session_state:
+        st.session_state.audiobook = None
     
     st.sidebar.markdown("### 🎯 Actions")
+    audiobook_mode = st.sidebar.checkbox("📚 Audiobook mode", help="Split long texts into chapters, rendered to disk and resumable")
     audio_clicked = st.sidebar.button("🎙 Generate Audio")
     
-    if audio_clicked:
-        # Get content from either file or text area
-        content = ""
-        if uploaded_file:
-            content = uploaded_file.read().decode("utf-8")
-        elif input_text.strip():
-            content = input_text
-        
-        if content:
-            with st.spinner("⏳ Processing..."):
-                # 1. Tone-Adaptive Text Rewriting (now uses the hybrid function)
-                rewritten = rewrite_text_with_llm(content, tone)
-                st.session_state.rewritten_text = rewritten
-
-                # 2. Voice Narration (using placeholder function)
-                audio = text_to_speech(rewritten, voice)
-                st.session_state.audio_bytes = audio
-            
-            if st.session_state.audio_bytes:
-                st.success("🎶 Audio Generation Complete!")
-                trigger_mega_confetti()
-                st.balloons()
-            else:
-                st.error("❌ Audio generation failed. Please check your credentials and try again.")
-            
-        else:
-            st.warning("⚠ Please provide text to generate audio!")
+    # Status messages render above the tabs; the tabs are laid out before
+    # generation so the rewrite can stream into the Text Studio column.
+    status_area = st.container()
     
     # Main content tabs
     tab1, tab2, tab3 = st.tabs(["📄 Text Studio", "🎧 Audio Center", "📊 Analytics Hub"])
@@ -449,13 +565,41 @@ def main():
         
         with col2:
             st.markdown("#### ✨ AI-Enhanced Version")
-            if st.session_state.rewritten_text:
-                st.markdown(f'<div class="modern-card"><p class="text-content">{st.session_state.rewritten_text}</p></div>', unsafe_allow_html=True)
+            enhanced_view = st.empty()
+    
+    if audio_clicked:
+        # Get content from either file or text area
+        content = ""
+        if uploaded_file:
+            content = uploaded_file.getvalue().decode("utf-8")
+        elif input_text.strip():
+            content = input_text
+        
+        with status_area:
+            if content:
+                # Rewriting and narration run as a background job (overlapped
+                # pipeline stages on a shared worker pool); this page polls it.
+                try:
+                    kind = "audiobook" if audiobook_mode else "narration"
+                    st.session_state.job_id = get_job_manager().submit(content, tone, voice, seed=REWRITE_SEED, kind=kind)
+                except QueueFullError as e:
+                    st.warning(f"⚠ EchoVerse is busy right now: {e}")
             else:
-                st.markdown(
-                    '<div class="modern-card" style="text-align: center; padding: 50px;"><p style="color: rgba(255,255,255,0.6); font-style: italic; font-size: 18px;">✨ AI-enhanced text will appear here after generation...</p></div>', 
-                    unsafe_allow_html=True
-                )
+                st.warning("⚠ Please provide text to generate audio!")
+    
+    job_running = False
+    if st.session_state.job_id:
+        job_running = poll_job(st.session_state.job_id, status_area, enhanced_view)
+    
+    # While a job runs, poll_job renders the partial rewrite instead
+    if not job_running:
+        if st.session_state.rewritten_text:
+            render_text_card(enhanced_view, st.session_state.rewritten_text)
+        else:
+            enhanced_view.markdown(
+                '<div class="modern-card" style="text-align: center; padding: 50px;"><p style="color: rgba(255,255,255,0.6); font-style: italic; font-size: 18px;">✨ AI-enhanced text will appear here after generation...</p></div>', 
+                unsafe_allow_html=True
+            )
     
     with tab2:
         st.markdown("### 🎧 Premium Audio Experience")
@@ -466,17 +610,20 @@ def main():
                     '<div class="modern-card" style="text-align: center; padding: 30px;">',
                     unsafe_allow_html=True
                 )
-                st.audio(st.session_state.audio_bytes, format="audio/mp3")
+                mime, ext = audio_format()
+                st.audio(st.session_state.audio_bytes, format=mime)
                 
                 col_a, col_b, col_c = st.columns(3)
                 with col_a:
-                    st.download_button("📥 Download MP3", data=st.session_state.audio_bytes, file_name="echoverse_audio.mp3", mime="audio/mp3")
+                    st.download_button(f"📥 Download {ext[1:].upper()}", data=st.session_state.audio_bytes, file_name=f"echoverse_audio{ext}", mime=mime)
                 with col_b:
-                    st.download_button("📱 Download for Mobile", data=st.session_state.audio_bytes, file_name="echoverse_mobile.mp3", mime="audio/mp3")
+                    st.download_button("📱 Download for Mobile", data=st.session_state.audio_bytes, file_name=f"echoverse_mobile{ext}", mime=mime)
                 with col_c:
                     st.button("📤 Share")
                 
                 st.markdown('</div>', unsafe_allow_html=True)
+        elif st.session_state.audiobook and os.path.exists(st.session_state.audiobook["path"]):
+            render_audiobook_panel(st.session_state.audiobook)
         else:
             st.markdown(
                 '<div class="modern-card" style="text-align: center; padding: 50px;"><p style="color: rgba(255,255,255,0.7); font-size: 20px;">🎵 Your audio masterpiece will appear here after generation...</p></div>', 
@@ -561,6 +708,8 @@ def main():
                 '<div class="modern-card" style="text-align: center; padding: 50px;"><p style="color: rgba(255,255,255,0.7); font-size: 20px;">📊 Intelligent analytics will appear here...</p></div>', 
                 unsafe_allow_html=True
             )
+        
+        render_latency_panel()
     
     st.markdown(
         """
@@ -601,5 +750,10 @@ def main():
         unsafe_allow_html=True,
     )
     
+    # Keep polling while a background job is in flight
+    if job_running:
+        time.sleep(JOB_POLL_INTERVAL)
+        st.rerun()
+    
 if __name__ == "__main__":
     main()
\ No newline at end of file
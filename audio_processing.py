@@ -0,0 +1,91 @@
+from math import gcd
+
+import numpy as np
+from scipy.signal import resample_poly
+
+# -------- Vectorized audio post-processing on NumPy arrays --------
+_INT16_MAX = 32767
+
+def to_float32(samples: np.ndarray) -> np.ndarray:
+    """Converts int16/int32/float PCM to float32 in [-1, 1]."""
+    if samples.dtype == np.int16:
+        return samples.astype(np.float32) / 32768.0
+    if samples.dtype == np.int32:
+        return samples.astype(np.float32) / 2147483648.0
+    if samples.dtype == np.uint8:
+        return (samples.astype(np.float32) - 128.0) / 128.0
+    return samples.astype(np.float32, copy=False)
+
+def to_int16(samples: np.ndarray) -> np.ndarray:
+    return (np.clip(samples, -1.0, 1.0) * _INT16_MAX).astype(np.int16)
+
+def downmix(samples: np.ndarray) -> np.ndarray:
+    """Averages a (frames, channels) array to mono; 1-D input is returned as is."""
+    if samples.ndim == 1:
+        return samples
+    return samples.mean(axis=1, dtype=np.float32)
+
+def resample(samples: np.ndarray, src_sr: int, dst_sr: int) -> np.ndarray:
+    """Polyphase resampling from src_sr to dst_sr."""
+    if src_sr == dst_sr or samples.size == 0:
+        return samples
+    g = gcd(src_sr, dst_sr)
+    return resample_poly(samples, dst_sr // g, src_sr // g).astype(np.float32, copy=False)
+
+def peak_normalize(samples: np.ndarray, headroom_db: float = 0.1) -> np.ndarray:
+    """Scales so the loudest sample sits headroom_db below full scale (as pydub's effects.normalize)."""
+    peak = np.max(np.abs(samples)) if samples.size else 0.0
+    if peak == 0:
+        return samples
+    target = 10 ** (-headroom_db / 20)
+    return samples * np.float32(target / peak)
+
+class RunningPeakNormalizer:
+    """
+    Peak normalization for audio arriving in chunks. The gain is set by the
+    loudest sample seen so far, so it only ever drops (when a louder chunk
+    arrives) instead of jumping per chunk, and no chunk clips. A single chunk
+    comes out exactly as peak_normalize would scale it.
+    """
+    def __init__(self, headroom_db: float = 0.1):
+        self.target = 10 ** (-headroom_db / 20)
+        self.peak = 0.0
+
+    def __call__(self, samples: np.ndarray) -> np.ndarray:
+        if samples.size:
+            self.peak = max(self.peak, float(np.max(np.abs(samples))))
+        if self.peak == 0:
+            return samples
+        return samples * np.float32(self.target / self.peak)
+
+def rms_normalize(samples: np.ndarray, target_dbfs: float = -20.0, headroom_db: float = 0.1) -> np.ndarray:
+    """Scales to a target RMS level, limited so peaks stay below headroom_db."""
+    if samples.size == 0:
+        return samples
+    rms = np.sqrt(np.mean(np.square(samples, dtype=np.float64)))
+    peak = np.max(np.abs(samples))
+    if rms == 0:
+        return samples
+    gain = min(10 ** (target_dbfs / 20) / rms, 10 ** (-headroom_db / 20) / peak)
+    return samples * np.float32(gain)
+
+def postprocess(
+    samples: np.ndarray,
+    src_sr: int,
+    dst_sr: int,
+    normalization="peak",
+) -> np.ndarray:
+    """
+    Full post-processing stage: down-mix to mono, resample to dst_sr and
+    normalize ("peak", "rms", "none", or a callable such as a
+    RunningPeakNormalizer). Returns int16 PCM ready to encode.
+    """
+    samples = downmix(to_float32(samples))
+    samples = resample(samples, src_sr, dst_sr)
+    if callable(normalization):
+        samples = normalization(samples)
+    elif normalization == "peak":
+        samples = peak_normalize(samples)
+    elif normalization == "rms":
+        samples = rms_normalize(samples)
+    return to_int16(samples)
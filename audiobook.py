@@ -0,0 +1,321 @@
+"""
+Audiobook mode: splits a long text into chapters and renders each one as its
+own file, with an on-disk manifest that checkpoints every finished chapter.
+A rerun over the same output directory resumes after the last finished
+chapter. The finished book is assembled from the chapter files into one
+combined file with chapter markers (ID3 CHAP/CTOC frames for MP3; an
+FFMETADATA sidecar for every format).
+
+    python audiobook.py book.txt --out audiobooks/my-book --tone Suspenseful
+
+The text is read line by line and only one chapter is held at a time, and
+audio is written to disk as each pipeline segment is encoded, so memory stays
+bounded by chapter size rather than book size.
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import struct
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional, Tuple, Union
+
+from cache import make_key
+from encoders import AUDIO_FORMAT, audio_duration, audio_extension
+
+# -------- Config --------
+AUDIOBOOK_DIR = os.environ.get("ECHOVERSE_AUDIOBOOK_DIR", "outputs/audiobooks")
+CHAPTER_MAX_WORDS = int(os.environ.get("ECHOVERSE_CHAPTER_MAX_WORDS", 4000))  # longer chapters are split into parts
+MANIFEST_NAME = "manifest.json"
+
+_NUMBER_WORD = (
+    r"(?:one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|thirteen|fourteen|fifteen|"
+    r"sixteen|seventeen|eighteen|nineteen|twenty|thirty|forty|fifty|sixty|seventy|eighty|ninety)"
+)
+_HEADING_RE = re.compile(
+    r"^(?:#{1,3}\s+\S.*"
+    r"|(?:chapter|part|book)\s+(?:\d+|[ivxlcdm]+|" + _NUMBER_WORD + r"(?:[- ]" + _NUMBER_WORD + r")?)\b(?:\s*[:.\-—]\s*\S.*|\.)?"
+    r"|(?:prologue|epilogue|preface|introduction|afterword)(?:\s*[:.\-—]\s*\S.*)?)$",
+    re.IGNORECASE,
+)
+_HEADING_MAX_WORDS = 12
+_SLUG_RE = re.compile(r"[^a-z0-9]+")
+
+# -------- Chapter detection --------
+def is_heading(line: str) -> bool:
+    """A chapter heading is a short line such as "Chapter 3: The Storm", "PART TWO", "Prologue" or "# Title"."""
+    return len(line.split()) <= _HEADING_MAX_WORDS and bool(_HEADING_RE.match(line))
+
+def iter_chapters(lines: Iterable[str], max_words: int = CHAPTER_MAX_WORDS) -> Iterator[Tuple[str, str]]:
+    """
+    Yields (title, text) for each chapter of an iterable of lines, e.g. an open
+    file, holding one chapter at a time. A heading must start its own
+    paragraph. Text before the first heading becomes "Opening", and chapters
+    longer than max_words are cut at paragraph boundaries (or line boundaries
+    inside an overlong paragraph) into numbered parts.
+    """
+    title, part = "Opening", 1
+    paragraphs, paragraph, words = [], [], 0
+    previous_blank = True
+
+    def chapter():
+        return (title if part == 1 else f"{title} (part {part})"), "\n\n".join(paragraphs)
+
+    for line in lines:
+        stripped = line.strip()
+        if previous_blank and stripped and is_heading(stripped):
+            if paragraph:
+                paragraphs.append(" ".join(paragraph))
+                paragraph = []
+            if paragraphs:
+                yield chapter()
+            title, part = stripped.lstrip("#").strip(), 1
+            paragraphs, words = [], 0
+            continue
+
+        previous_blank = not stripped
+        if stripped:
+            paragraph.append(stripped)
+            words += len(stripped.split())
+        if paragraph and (not stripped or words >= 2 * max_words):
+            paragraphs.append(" ".join(paragraph))
+            paragraph = []
+        if paragraphs and not paragraph and words >= max_words:
+            yield chapter()
+            paragraphs, words, part = [], 0, part + 1
+
+    if paragraph:
+        paragraphs.append(" ".join(paragraph))
+    if paragraphs:
+        yield chapter()
+
+def _open_lines(source: Union[str, Path]) -> Iterator[str]:
+    """Lines of a file path, streamed, or of an in-memory text."""
+    if isinstance(source, Path):
+        with source.open(encoding="utf-8") as f:
+            yield from f
+    else:
+        yield from io.StringIO(source)
+
+# -------- Chapter markers --------
+def _syncsafe(n: int) -> bytes:
+    return bytes([(n >> 21) & 0x7F, (n >> 14) & 0x7F, (n >> 7) & 0x7F, n & 0x7F])
+
+def _id3_frame(frame_id: str, body: bytes) -> bytes:
+    return frame_id.encode("ascii") + _syncsafe(len(body)) + b"\x00\x00" + body
+
+def _id3_text(frame_id: str, text: str) -> bytes:
+    return _id3_frame(frame_id, b"\x03" + text.encode("utf-8"))  # encoding 3 = UTF-8 (ID3v2.4)
+
+def id3_chapter_tag(book_title: str, chapters: list) -> bytes:
+    """ID3v2.4 tag with a title, a table of contents (CTOC) and one CHAP frame per chapter."""
+    element_ids = [f"ch{i}".encode("ascii") for i in range(len(chapters))]
+    toc_ids = element_ids[:255]  # the CTOC entry count is a single byte
+    frames = [
+        _id3_text("TIT2", book_title),
+        _id3_frame("CTOC", b"toc\x00" + b"\x03" + bytes([len(toc_ids)]) + b"".join(i + b"\x00" for i in toc_ids)),
+    ]
+    start = 0
+    for element_id, entry in zip(element_ids, chapters):
+        end = start + int(round(entry["duration_s"] * 1000))
+        body = element_id + b"\x00" + struct.pack(">IIII", start, end, 0xFFFFFFFF, 0xFFFFFFFF)
+        frames.append(_id3_frame("CHAP", body + _id3_text("TIT2", entry["title"])))
+        start = end
+    payload = b"".join(frames)
+    return b"ID3\x04\x00\x00" + _syncsafe(len(payload)) + payload
+
+def _ffmetadata_escape(value: str) -> str:
+    return re.sub(r"([=;#\\\n])", r"\\\1", value)
+
+def ffmetadata(book_title: str, chapters: list) -> str:
+    """FFMETADATA1 chapter list, e.g. for `ffmpeg -i book.mp3 -i book.ffmetadata -map_metadata 1 book.m4b`."""
+    lines = [";FFMETADATA1", f"title={_ffmetadata_escape(book_title)}"]
+    start = 0
+    for entry in chapters:
+        end = start + int(round(entry["duration_s"] * 1000))
+        lines += ["", "[CHAPTER]", "TIMEBASE=1/1000", f"START={start}", f"END={end}", f"title={_ffmetadata_escape(entry['title'])}"]
+        start = end
+    return "\n".join(lines) + "\n"
+
+# -------- Rendering --------
+def _slug(title: str) -> str:
+    return _SLUG_RE.sub("-", title.lower()).strip("-")[:40] or "chapter"
+
+def _write_json(path: Path, data: dict) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+def _model_ids() -> tuple:
+    from pipeline import model_ids
+
+    return model_ids()
+
+def _render_chapter(text: str, tone: str, voice_label: str, seed: Optional[int], audio_path: Path, text_path: Path) -> None:
+    """
+    Streams one chapter through the rewrite -> TTS -> encode pipeline into
+    .part files, then renames them. The pipeline runs strict, so a failed
+    rewrite or silent audio raises instead of producing a chapter file.
+    """
+    from pipeline import run_pipeline
+
+    audio_tmp = audio_path.with_name(audio_path.name + ".part")
+    text_tmp = text_path.with_name(text_path.name + ".part")
+    try:
+        with audio_tmp.open("wb") as audio_file, text_tmp.open("w", encoding="utf-8") as text_file:
+            for kind, payload in run_pipeline(text, tone, voice_label, seed=seed, strict=True):
+                if kind == "audio":
+                    audio_file.write(payload)
+                elif kind == "text":
+                    text_file.write(payload)
+        os.replace(text_tmp, text_path)
+        os.replace(audio_tmp, audio_path)
+    finally:
+        for tmp in (audio_tmp, text_tmp):
+            if tmp.exists():
+                tmp.unlink()
+
+def render_audiobook(
+    source: Union[str, Path],
+    out_dir: Union[str, Path],
+    tone: str,
+    voice_label: str = "VoiceA",
+    seed: Optional[int] = 0,
+    title: Optional[str] = None,
+    on_progress: Optional[Callable[[int, int, str], None]] = None,
+) -> dict:
+    """
+    Renders source (a file path, streamed line by line, or an in-memory text)
+    into out_dir and returns the manifest. Chapters already finished with the
+    same text and settings are reused, so a rerun after a failure resumes
+    where it stopped. A chapter that fails is recorded as "failed" and the
+    rest are still rendered; the book is then not assembled and a
+    RuntimeError names the failed chapters, which a rerun renders again.
+    on_progress(done, total, chapter_title) is called before each chapter and
+    once at the end.
+    """
+    out_dir = Path(out_dir)
+    chapters_dir = out_dir / "chapters"
+    chapters_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_dir / MANIFEST_NAME
+    extension = audio_extension()
+
+    try:
+        previous = json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        previous = {}
+    finished = {entry["index"]: entry for entry in previous.get("chapters", []) if entry.get("status") == "done"}
+
+    title = title or (source.stem if isinstance(source, Path) else "Audiobook")
+    total = sum(1 for _ in iter_chapters(_open_lines(source)))
+    models = _model_ids()
+    manifest = {
+        "title": title,
+        "settings": {"tone": tone, "voice": voice_label, "seed": seed, "audio_format": AUDIO_FORMAT},
+        "chapters": [],
+        "combined": None,
+    }
+
+    for index, (chapter_title, text) in enumerate(iter_chapters(_open_lines(source)), 1):
+        if on_progress:
+            on_progress(index - 1, total, chapter_title)
+        key = make_key(hashlib.sha256(text.encode("utf-8")).hexdigest(), tone, voice_label, seed, AUDIO_FORMAT, *models)
+        done = finished.get(index)
+        if done and done["key"] == key and (out_dir / done["file"]).exists():
+            manifest["chapters"].append(done)
+            continue
+
+        stem = f"{index:03d}-{_slug(chapter_title)}"
+        entry = {
+            "index": index,
+            "title": chapter_title,
+            "key": key,
+            "words": len(text.split()),
+            "file": f"chapters/{stem}{extension}",
+            "text_file": f"chapters/{stem}.txt",
+            "status": "rendering",
+        }
+        manifest["chapters"].append(entry)
+        _write_json(manifest_path, manifest)
+
+        start = time.perf_counter()
+        try:
+            _render_chapter(text, tone, voice_label, seed, out_dir / entry["file"], out_dir / entry["text_file"])
+        except Exception as e:
+            print(f"[{index}/{total}] {chapter_title} failed: {e}")
+            entry.update(status="failed", error=str(e))
+            _write_json(manifest_path, manifest)
+            continue
+        audio_path = out_dir / entry["file"]
+        entry.update(
+            status="done",
+            duration_s=round(audio_duration(audio_path.read_bytes()), 3),
+            bytes=audio_path.stat().st_size,
+            render_s=round(time.perf_counter() - start, 3),
+        )
+        _write_json(manifest_path, manifest)
+
+    failed = [entry["title"] for entry in manifest["chapters"] if entry["status"] == "failed"]
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {total} chapters failed ({', '.join(failed)}); rerun to retry them.")
+
+    manifest["combined"] = assemble(out_dir, manifest)
+    _write_json(manifest_path, manifest)
+    if on_progress:
+        on_progress(total, total, "")
+    return manifest
+
+def assemble(out_dir: Path, manifest: dict) -> str:
+    """
+    Concatenates the chapter files into one book file (chapter streams are
+    self-contained, so byte concatenation is valid), prefixed with an ID3
+    chapter tag for MP3, and writes the FFMETADATA chapter sidecar.
+    """
+    chapters = manifest["chapters"]
+    stem = _slug(manifest["title"])
+    combined = out_dir / f"{stem}{audio_extension()}"
+    tmp = combined.with_name(combined.name + ".part")
+    with tmp.open("wb") as out:
+        if AUDIO_FORMAT == "mp3":
+            out.write(id3_chapter_tag(manifest["title"], chapters))
+        for entry in chapters:
+            with (out_dir / entry["file"]).open("rb") as chapter_file:
+                shutil.copyfileobj(chapter_file, out)
+    os.replace(tmp, combined)
+    (out_dir / f"{stem}.ffmetadata").write_text(ffmetadata(manifest["title"], chapters), encoding="utf-8")
+    return combined.name
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Render a long text as a chaptered, resumable audiobook.")
+    parser.add_argument("source", help="text file")
+    parser.add_argument("--out", help=f"output directory (default: {AUDIOBOOK_DIR}/<file name>)")
+    parser.add_argument("--tone", default="Neutral", help="Neutral, Suspenseful or Inspiring")
+    parser.add_argument("--voice", default="VoiceA", help="voice label")
+    parser.add_argument("--seed", type=int, default=0, help="rewrite seed")
+    parser.add_argument("--title", help="book title (default: file name)")
+    args = parser.parse_args()
+
+    # Offline runs have no interactive latency target unless one is configured explicitly.
+    os.environ.setdefault("ECHOVERSE_LLM_LATENCY_BUDGET_S", "0")
+
+    source = Path(args.source)
+    out_dir = Path(args.out or os.path.join(AUDIOBOOK_DIR, _slug(source.stem)))
+
+    def progress(done: int, total: int, chapter_title: str) -> None:
+        if chapter_title:
+            print(f"[{done + 1}/{total}] {chapter_title}")
+
+    try:
+        manifest = render_audiobook(source, out_dir, args.tone, args.voice, args.seed, title=args.title, on_progress=progress)
+    except RuntimeError as e:
+        print(e)
+        raise SystemExit(1)
+    duration = sum(entry["duration_s"] for entry in manifest["chapters"])
+    print(f"{len(manifest['chapters'])} chapters, {duration / 60:.1f} min -> {out_dir / manifest['combined']}")
+
+if __name__ == "__main__":
+    main()
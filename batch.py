@@ -0,0 +1,206 @@
+"""
+Headless batch mode: rewrites and narrates every text file in a directory
+(or listed in a manifest) without the Streamlit UI.
+
+    python batch.py books/ --out renders/ --tone Inspiring --workers 4
+    python batch.py manifest.txt --out renders/      # one path per line, relative to the manifest
+    python batch.py manifest.json --out renders/     # [{"path": ..., "tone": ..., "voice": ...}, ...]
+
+Models are loaded once and shared by all workers (VITS calls from concurrent
+workers are merged by the micro-batcher). A file is skipped when its output
+exists and the previous results manifest recorded the same text, tone, voice,
+seed and audio format for it. Timings and statuses go to
+<out>/batch_results.json, which is rewritten as each file finishes.
+Manifest entries with absolute paths or paths outside the manifest's
+directory are written under their file name, with -2, -3, ... appended
+when two entries would otherwise share outputs.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from cache import make_key
+
+RESULTS_NAME = "batch_results.json"
+
+def discover(source: Path, default_tone: str, default_voice: str) -> list:
+    """Returns (path, relative name, tone, voice) for a directory of .txt files or a manifest."""
+    if source.is_dir():
+        return [
+            (path, path.relative_to(source), default_tone, default_voice)
+            for path in sorted(source.rglob("*.txt"))
+            if not path.name.endswith(".rewritten.txt")
+        ]
+
+    base = source.parent
+    used = set()
+    if source.suffix == ".json":
+        entries = json.loads(source.read_text(encoding="utf-8"))
+    else:
+        entries = [
+            {"path": line.strip()}
+            for line in source.read_text(encoding="utf-8").splitlines()
+            if line.strip() and not line.lstrip().startswith("#")
+        ]
+
+    items = []
+    for entry in entries:
+        name = Path(entry["path"])
+        path = name if name.is_absolute() else base / name
+        if name.is_absolute() or ".." in name.parts:
+            name = Path(path.name)  # outputs stay inside --out
+        name = _unique_name(name, used)
+        items.append((path, name, entry.get("tone", default_tone), entry.get("voice", default_voice)))
+    return items
+
+def _unique_name(name: Path, used: set) -> Path:
+    """name, or name with a -2, -3, ... suffix if an earlier entry already writes the same outputs."""
+    candidate, n = name, 1
+    while candidate.with_suffix("").as_posix().lower() in used:
+        n += 1
+        candidate = name.with_name(f"{name.stem}-{n}{name.suffix}")
+    used.add(candidate.with_suffix("").as_posix().lower())
+    return candidate
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+class BatchRunner:
+    """Renders files on a thread pool and keeps the results manifest up to date."""
+    def __init__(self, out_dir: Path, seed: int, force: bool):
+        from encoders import AUDIO_FORMAT, audio_extension
+
+        self.out_dir = out_dir
+        self.seed = seed
+        self.force = force
+        self.audio_format = AUDIO_FORMAT
+        self.extension = audio_extension()
+        self.results_path = out_dir / RESULTS_NAME
+        self.previous = self._load_previous()
+        self.results = {}
+        self._lock = threading.Lock()
+
+    def _load_previous(self) -> dict:
+        try:
+            data = json.loads(self.results_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        return {entry["source"]: entry for entry in data.get("files", []) if entry.get("status") != "failed"}
+
+    def render(self, path: Path, name: Path, tone: str, voice: str) -> dict:
+        """
+        Rewrites and narrates one file. A failed LLM rewrite or a silent TTS
+        fallback is recorded as "failed" without writing outputs, so the next
+        run renders the file again.
+        """
+        from rewriter import LLM_BACKEND, LLM_ERROR_MESSAGE, MISTRAL_MODEL_ID, hybrid_rewrite
+        from tts import HF_MODEL_ID, TTS_BACKEND, synthesize_bytes
+
+        audio_path = self.out_dir / name.with_suffix(self.extension)
+        text_path = self.out_dir / name.with_suffix(".rewritten.txt")
+        entry = {"source": str(path), "output": str(audio_path), "text_output": str(text_path), "tone": tone, "voice": voice}
+        start = time.perf_counter()
+        try:
+            text = path.read_text(encoding="utf-8")
+            text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            # Switching the rewriter or TTS model/backend makes earlier outputs stale.
+            entry["key"] = make_key(
+                text_hash, tone, voice, self.seed, self.audio_format,
+                LLM_BACKEND.name, MISTRAL_MODEL_ID, HF_MODEL_ID, TTS_BACKEND,
+            )
+            entry["words"] = len(text.split())
+
+            previous = self.previous.get(str(path))
+            if not self.force and previous and previous.get("key") == entry["key"] and audio_path.exists():
+                entry.update(status="skipped", total_s=0.0)
+                return entry
+
+            rewrite_start = time.perf_counter()
+            rewritten = hybrid_rewrite(text, tone, seed=self.seed)
+            entry["rewrite_s"] = round(time.perf_counter() - rewrite_start, 3)
+            if LLM_ERROR_MESSAGE in rewritten:
+                raise RuntimeError("LLM rewrite failed")
+
+            synth_start = time.perf_counter()
+            audio = synthesize_bytes(rewritten, voice, allow_silence=False)
+            entry["synthesize_s"] = round(time.perf_counter() - synth_start, 3)
+
+            _write_atomic(text_path, rewritten.encode("utf-8"))
+            _write_atomic(audio_path, audio)
+            entry.update(status="rendered", audio_bytes=len(audio))
+        except Exception as e:
+            entry.update(status="failed", error=str(e))
+        entry["total_s"] = round(time.perf_counter() - start, 3)
+        return entry
+
+    def record(self, entry: dict, settings: dict) -> None:
+        with self._lock:
+            self.results[entry["source"]] = entry
+            summary = {
+                "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "settings": settings,
+                "files": list(self.results.values()),
+            }
+            _write_atomic(self.results_path, json.dumps(summary, indent=2).encode("utf-8"))
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Rewrite and narrate a directory or manifest of .txt files.")
+    parser.add_argument("source", help="directory of .txt files, or a manifest (.txt list or .json)")
+    parser.add_argument("--out", required=True, help="output directory")
+    parser.add_argument("--tone", default="Neutral", help="default tone (Neutral, Suspenseful, Inspiring)")
+    parser.add_argument("--voice", default="VoiceA", help="default voice label")
+    parser.add_argument("--workers", type=int, default=2, help="files processed concurrently")
+    parser.add_argument("--seed", type=int, default=0, help="rewrite seed (fixed, so reruns are reproducible)")
+    parser.add_argument("--force", action="store_true", help="re-render files even if their output is up to date")
+    args = parser.parse_args()
+
+    # Offline runs have no interactive latency target unless one is configured explicitly.
+    os.environ.setdefault("ECHOVERSE_LLM_LATENCY_BUDGET_S", "0")
+
+    source = Path(args.source)
+    items = discover(source, args.tone, args.voice)
+    if not items:
+        print(f"No input files found in {source}")
+        return 1
+
+    import rewriter
+    import tts
+
+    print("Loading models...")
+    tts.load_hf_model()
+    rewriter.load_llm()
+
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    runner = BatchRunner(out_dir, seed=args.seed, force=args.force)
+    settings = {"source": str(source), "workers": args.workers, "seed": args.seed, "audio_format": runner.audio_format}
+
+    start = time.perf_counter()
+    counts = {"rendered": 0, "skipped": 0, "failed": 0}
+    with ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="echoverse-batch") as pool:
+        futures = [pool.submit(runner.render, *item) for item in items]
+        for done, future in enumerate(as_completed(futures), 1):
+            entry = future.result()
+            runner.record(entry, settings)
+            counts[entry["status"]] += 1
+            detail = entry.get("error") or f"{entry['total_s']:.1f}s"
+            print(f"[{done}/{len(items)}] {entry['status']:<8} {entry['source']} ({detail})")
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"Done in {elapsed:.1f}s: {counts['rendered']} rendered, {counts['skipped']} skipped, "
+        f"{counts['failed']} failed. Results: {runner.results_path}"
+    )
+    return 1 if counts["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List
+
+class MicroBatcher:
+    """
+    Cross-request dynamic batching. Items submitted from concurrent callers are
+    collected for up to max_latency_ms (or until max_batch items are waiting),
+    passed to batch_fn as one list, and each result is routed back to the
+    caller's future. batch_fn must return one result per item, in order.
+    """
+    def __init__(self, batch_fn: Callable[[list], list], max_batch: int = 8, max_latency_ms: float = 5.0):
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_latency = max_latency_ms / 1000.0
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None:
+            with self._start_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._loop, name="micro-batcher", daemon=True)
+                    self._worker.start()
+
+    def submit(self, item) -> Future:
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def run(self, items: list) -> List:
+        """Submits items and blocks until all of their results are available."""
+        futures = [self.submit(item) for item in items]
+        return [future.result() for future in futures]
+
+    def _loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_latency
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            items = [item for item, _ in batch]
+            try:
+                results = self.batch_fn(items)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+            with self._stats_lock:
+                self.batches += 1
+                self.items += len(batch)
+
+    def stats(self) -> dict:
+        """Batch count, items processed and average batch fill (items per batch / max_batch)."""
+        with self._stats_lock:
+            fill = self.items / (self.batches * self.max_batch) if self.batches else 0.0
+            return {"batches": self.batches, "items": self.items, "avg_fill": round(fill, 3)}
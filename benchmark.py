@@ -0,0 +1,302 @@
+"""
+Offline benchmark for the rewrite and TTS hot paths.
+
+Runs preprocess_text, ToneBasedTextRewriter.rewrite_text, hybrid_rewrite and
+synthesize over a synthetic corpus (short, paragraph and book-length texts)
+with tiny randomly initialized VITS and causal-LM models, so nothing is
+downloaded. Reports p50/p95 latency, words/sec, real-time factor and peak RSS
+(sampled while each case runs) per benchmark, plus the per-stage timings collected by metrics.TRACER, and
+saves everything as JSON for comparison across commits.
+
+    python benchmark.py                         # writes benchmark_results/<commit>.json
+    python benchmark.py --full                  # also runs the LLM and TTS paths on the book text
+    python benchmark.py --compare benchmark_results/abc1234.json
+    python benchmark.py --real-models           # use the configured models instead of the tiny ones
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+CORPUS_SIZES = {"short": 30, "paragraph": 150, "book": 5000}  # words per text
+TONE = "Suspenseful"
+
+_WORDS = (
+    "the a an old house river light dark night morning city road door window voice "
+    "walked said looked found started happened moved turned waited listened "
+    "big small quiet quickly slowly important strange distant problem answer "
+    "and but then while because after before under over through beyond"
+).split()
+_EXTRAS = ["$12.50", "42%", "3rd", "1999", "1,250", "Mr.", "Dr.", "3.14", "&", "7"]
+
+def synthetic_text(words: int, seed: int = 0) -> str:
+    """Deterministic pseudo-prose: 8-16 word sentences, ~80-word paragraphs, with numbers and abbreviations."""
+    rng = random.Random(seed)
+    paragraphs, sentences, count = [], [], 0
+    while count < words:
+        length = min(rng.randint(8, 16), words - count)
+        tokens = [rng.choice(_EXTRAS) if rng.random() < 0.08 else rng.choice(_WORDS) for _ in range(length)]
+        sentences.append(tokens[0].capitalize() + " " + " ".join(tokens[1:]) + rng.choice(".!?"))
+        count += length
+        if sum(len(s.split()) for s in sentences) >= 80:
+            paragraphs.append(" ".join(sentences))
+            sentences = []
+    if sentences:
+        paragraphs.append(" ".join(sentences))
+    return "\n\n".join(paragraphs)
+
+# -------- Tiny offline models --------
+_TINY_VITS_CHARS = list("abcdefghijklmnopqrstuvwxyz '-.,!?")
+
+def tiny_vits(workdir: str):
+    """Randomly initialized (seeded) small VITS with a character vocabulary written to workdir."""
+    import torch
+    from transformers import VitsConfig, VitsModel, VitsTokenizer
+
+    vocab = {token: i for i, token in enumerate(["<pad>"] + _TINY_VITS_CHARS + ["<unk>"])}
+    vocab_path = os.path.join(workdir, "tiny_vits_vocab.json")
+    with open(vocab_path, "w", encoding="utf-8") as f:
+        json.dump(vocab, f)
+    tokenizer = VitsTokenizer(vocab_path, phonemize=False)
+
+    config = VitsConfig(
+        vocab_size=len(vocab),
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        ffn_dim=64,
+        flow_size=16,
+        spectrogram_bins=33,
+        upsample_initial_channel=32,
+        upsample_rates=[8, 8, 2, 2],
+        upsample_kernel_sizes=[16, 16, 4, 4],
+        resblock_kernel_sizes=[3],
+        resblock_dilation_sizes=[[1, 3, 5]],
+        duration_predictor_num_flows=2,
+        duration_predictor_filter_channels=16,
+        prior_encoder_num_flows=2,
+        posterior_encoder_num_wavenet_layers=2,
+        pad_token_id=0,
+        sampling_rate=16000,
+    )
+    torch.manual_seed(0)
+    return VitsModel(config).eval(), tokenizer
+
+class _NoCache:
+    """Stands in for the audio cache so every run renders instead of hitting a cached file."""
+    def get(self, key):
+        return None
+
+    def put(self, key, data):
+        return None
+
+# -------- Measurement --------
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def current_rss_mb():
+    """Current resident set size from /proc (Linux); None where it is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+class RSSSampler:
+    """
+    Samples the resident set size on a background thread while a case runs,
+    giving that case's peak and its growth over the RSS at the start. Where
+    /proc is unavailable, falls back to the lifetime peak (ru_maxrss).
+    """
+    def __init__(self, interval_s: float = 0.005):
+        self.interval_s = interval_s
+        self.start_mb = self.peak_mb = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            self.peak_mb = max(self.peak_mb, current_rss_mb() or 0.0)
+
+    def __enter__(self):
+        self.start_mb = current_rss_mb()
+        if self.start_mb is not None:
+            self.peak_mb = self.start_mb
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._thread is None:
+            self.peak_mb = peak_rss_mb()
+            return
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, current_rss_mb() or 0.0)
+
+    def result(self) -> dict:
+        if self.start_mb is None:
+            return {"peak_rss_mb": self.peak_mb}
+        return {"peak_rss_mb": round(self.peak_mb, 1), "rss_delta_mb": round(self.peak_mb - self.start_mb, 1)}
+
+def measure(fn, repeat: int, warmup: int = 1) -> list:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def summarize(samples: list) -> dict:
+    ms = np.asarray(samples) * 1000
+    return {
+        "runs": len(samples),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+    }
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+# -------- Benchmarks --------
+def run_benchmarks(args) -> dict:
+    # Model choices and scratch locations have to be in the environment before rewriter/tts import.
+    scratch = tempfile.mkdtemp(prefix="echoverse-bench-")
+    if not args.real_models:
+        os.environ["ECHOVERSE_LLM_BACKEND"] = "tiny"
+    os.environ.setdefault("ECHOVERSE_LLM_LATENCY_BUDGET_S", "0")
+    os.environ["ECHOVERSE_TTS_PROCESSES"] = "0"
+    os.environ["ECHOVERSE_AUDIO_CACHE_DIR"] = os.path.join(scratch, "cache")
+    os.chdir(scratch)  # synthesize() writes outputs/ relative to the working directory
+
+    import torch
+    import transformers
+    import rewriter
+    import tts
+    from metrics import TRACER
+
+    tts.AUDIO_CACHE = _NoCache()
+    if not args.real_models:
+        model, tokenizer = tiny_vits(scratch)
+        tts.HF_MODEL = model.to(tts.HF_DEVICE)
+        tts.HF_TOKENIZER = tokenizer
+    tts.load_hf_model()
+    rewriter.load_llm()
+
+    corpus = {name: synthetic_text(words, seed=i) for i, (name, words) in enumerate(CORPUS_SIZES.items())}
+    heavy = ["short", "paragraph", "book"] if args.full else ["short", "paragraph"]
+    sample_rate = tts.HF_MODEL.config.sampling_rate
+
+    cases = [
+        ("preprocess_text", list(corpus), lambda text: tts.preprocess_text(text), None),
+        ("rule_rewrite", list(corpus), lambda text: rewriter.rule_based_rewriter.rewrite_text(text, TONE, seed=0), None),
+        ("hybrid_rewrite", heavy, lambda text: rewriter.hybrid_rewrite(text, TONE), None),
+        ("synthesize_waveform", heavy, lambda text: tts.synthesize_waveform(tts.preprocess_text(text)), "rtf"),
+        ("synthesize", heavy, lambda text: tts.synthesize(text), None),
+    ]
+
+    results = []
+    audio_seconds = {}
+    for name, corpus_names, fn, extra in cases:
+        for corpus_name in corpus_names:
+            text = corpus[corpus_name]
+            words = len(text.split())
+            row = {"name": name, "corpus": corpus_name, "words": words}
+            sampler = RSSSampler()
+            try:
+                with sampler:
+                    samples = measure(lambda: fn(text), repeat=args.repeat)
+                row.update(summarize(samples))
+                row["words_per_s"] = round(words / (row["p50_ms"] / 1000), 1)
+                if extra == "rtf":
+                    audio_seconds[corpus_name] = len(fn(text)) / sample_rate
+                if corpus_name in audio_seconds and name.startswith("synthesize"):
+                    row["audio_s"] = round(audio_seconds[corpus_name], 3)
+                    row["rtf"] = round(row["p50_ms"] / 1000 / max(audio_seconds[corpus_name], 1e-9), 4)
+            except Exception as e:
+                row["error"] = str(e)
+            row.update(sampler.result())
+            results.append(row)
+            print(_format_row(row))
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "transformers": transformers.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "models": "configured" if args.real_models else "tiny",
+            "repeat": args.repeat,
+        },
+        "corpus": {name: len(text.split()) for name, text in corpus.items()},
+        "benchmarks": results,
+        "stages": TRACER.summary(),
+    }
+
+def _format_row(row: dict) -> str:
+    label = f"{row['name']:<20} {row['corpus']:<10}"
+    if "error" in row:
+        return f"{label} error: {row['error']}"
+    rtf = f"  rtf {row['rtf']:.3f}" if "rtf" in row else ""
+    return f"{label} p50 {row['p50_ms']:>10.2f} ms  p95 {row['p95_ms']:>10.2f} ms  {row['words_per_s']:>10.1f} words/s{rtf}"
+
+def compare(current: dict, baseline: dict) -> None:
+    """Prints p50 ratios (current / baseline) for benchmarks present in both runs."""
+    before = {(row["name"], row["corpus"]): row for row in baseline["benchmarks"] if "p50_ms" in row}
+    print(f"\nvs {baseline['meta']['commit']} (p50 ratio, >1 is slower):")
+    for row in current["benchmarks"]:
+        old = before.get((row["name"], row["corpus"]))
+        if old and "p50_ms" in row:
+            print(f"  {row['name']:<20} {row['corpus']:<10} {row['p50_ms'] / old['p50_ms']:.2f}x")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline benchmark for EchoVerse rewrite and TTS paths.")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark (after one warm-up run)")
+    parser.add_argument("--full", action="store_true", help="also run hybrid_rewrite and synthesis on the book text")
+    parser.add_argument("--real-models", action="store_true", help="use the configured models instead of tiny random ones")
+    parser.add_argument("--output", help="results file (default: benchmark_results/<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    repo = os.path.dirname(os.path.abspath(__file__))
+    output = os.path.abspath(args.output or os.path.join(repo, "benchmark_results", f"{git_commit()}.json"))
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = run_benchmarks(args)
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+    if baseline is not None:
+        compare(results, baseline)
+
+if __name__ == "__main__":
+    main()
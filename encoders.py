@@ -0,0 +1,288 @@
+import os
+import random
+import struct
+import subprocess
+import threading
+from typing import Optional
+
+import numpy as np
+
+try:
+    import lameenc
+    _HAS_LAMEENC = True
+except Exception:
+    _HAS_LAMEENC = False
+
+try:
+    import opuslib
+    _HAS_OPUSLIB = True
+except Exception:
+    _HAS_OPUSLIB = False
+
+# -------- Output formats --------
+# format -> (mime type, file extension, bitrate in kbit/s)
+AUDIO_FORMATS = {
+    "mp3": ("audio/mpeg", ".mp3", 48),
+    "opus": ("audio/ogg", ".ogg", 24),
+}
+
+AUDIO_FORMAT = os.environ.get("ECHOVERSE_AUDIO_FORMAT", "mp3")
+if AUDIO_FORMAT not in AUDIO_FORMATS:
+    AUDIO_FORMAT = "mp3"
+
+def audio_mime(fmt: Optional[str] = None) -> str:
+    return AUDIO_FORMATS[fmt or AUDIO_FORMAT][0]
+
+def audio_extension(fmt: Optional[str] = None) -> str:
+    return AUDIO_FORMATS[fmt or AUDIO_FORMAT][1]
+
+# -------- Durations --------
+# MPEG layer III bitrates (kbit/s) by bitrate index, for MPEG-1 and MPEG-2/2.5
+_MP3_BITRATES = {
+    3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MP3_BITRATES[0] = _MP3_BITRATES[2]
+_MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+def _syncsafe_int(data: bytes) -> int:
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+def _mp3_duration(data: bytes) -> float:
+    """Sums layer III frame durations, walking frame headers (and skipping a leading ID3v2 tag)."""
+    i = 10 + _syncsafe_int(data[6:10]) if data[:3] == b"ID3" and len(data) >= 10 else 0
+    seconds = 0.0
+    while i + 4 <= len(data):
+        b1, b2 = data[i + 1], data[i + 2]
+        if data[i] != 0xFF or b1 & 0xE0 != 0xE0:
+            i += 1
+            continue
+        version, layer = (b1 >> 3) & 3, (b1 >> 1) & 3
+        bitrate_index, rate_index, padding = b2 >> 4, (b2 >> 2) & 3, (b2 >> 1) & 1
+        if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+            i += 1
+            continue
+        rate = _MP3_SAMPLE_RATES[version][rate_index]
+        bitrate = _MP3_BITRATES[version][bitrate_index] * 1000
+        samples = 1152 if version == 3 else 576
+        seconds += samples / rate
+        i += samples // 8 * bitrate // rate + padding
+    return seconds
+
+def _ogg_opus_duration(data: bytes) -> float:
+    """Sums (last granule - pre-skip) over every chained Opus stream; granules count 48 kHz samples."""
+    streams = []  # [serial, pre-skip, last granule position]
+    i = data.find(b"OggS")
+    while 0 <= i and i + 27 <= len(data):
+        granule = int.from_bytes(data[i + 6:i + 14], "little", signed=True)
+        serial = data[i + 14:i + 18]
+        segments = data[i + 26]
+        body_start = i + 27 + segments
+        body_end = body_start + sum(data[i + 27:body_start])
+        body = data[body_start:body_end]
+        if body.startswith(b"OpusHead"):
+            streams.append([serial, int.from_bytes(body[10:12], "little"), 0])
+        elif streams and streams[-1][0] == serial and granule >= 0:
+            streams[-1][2] = granule
+        i = data.find(b"OggS", body_end)
+    return sum(max(0, granule - pre_skip) for _, pre_skip, granule in streams) / 48000
+
+def audio_duration(data: bytes, fmt: Optional[str] = None) -> float:
+    """Playback length in seconds of encoded audio produced by make_encoder (concatenations included)."""
+    fmt = fmt or AUDIO_FORMAT
+    if fmt == "mp3":
+        return _mp3_duration(data)
+    if fmt == "opus":
+        return _ogg_opus_duration(data)
+    return 0.0
+
+# -------- Encoders --------
+class AudioEncoder:
+    """
+    Incremental encoder for int16 mono PCM. encode() accepts chunks as they are
+    produced and returns whatever encoded bytes are ready; flush() ends the
+    stream and returns the rest. The concatenation of all returned bytes is
+    one complete file.
+    """
+    def encode(self, pcm: np.ndarray) -> bytes:
+        raise NotImplementedError
+
+    def flush(self) -> bytes:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Releases resources if the stream is abandoned before flush()."""
+
+class LameEncoder(AudioEncoder):
+    """In-process MP3 encoder (lameenc); no subprocess at all."""
+    def __init__(self, sample_rate: int, bitrate: int):
+        self._encoder = lameenc.Encoder()
+        self._encoder.set_bit_rate(bitrate)
+        self._encoder.set_in_sample_rate(sample_rate)
+        self._encoder.set_channels(1)
+        self._encoder.set_quality(2)
+
+    def encode(self, pcm: np.ndarray) -> bytes:
+        return bytes(self._encoder.encode(pcm.astype(np.int16, copy=False).tobytes()))
+
+    def flush(self) -> bytes:
+        return bytes(self._encoder.flush())
+
+def _ogg_crc_table() -> list:
+    table = []
+    for i in range(256):
+        crc = i << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7 if crc & 0x80000000 else crc << 1) & 0xFFFFFFFF
+        table.append(crc)
+    return table
+
+_OGG_CRC_TABLE = _ogg_crc_table()
+
+def _ogg_crc(data: bytes) -> int:
+    crc = 0
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ _OGG_CRC_TABLE[(crc >> 24) ^ byte]
+    return crc
+
+class OggOpusEncoder(AudioEncoder):
+    """
+    In-process Ogg/Opus encoder (opuslib over libopus); no subprocess at all.
+    PCM is cut into 20 ms Opus frames and each encode() call's packets are
+    written as Ogg pages, so every stream is one complete Ogg Opus file.
+    """
+    SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+    _PACKETS_PER_PAGE = 50  # one second of 20 ms frames
+
+    def __init__(self, sample_rate: int, bitrate: int):
+        self._encoder = opuslib.Encoder(sample_rate, 1, "voip")
+        self._encoder.bitrate = bitrate * 1000
+        self._sample_rate = sample_rate
+        self._frame = sample_rate // 50
+        # Granule positions and pre-skip count 48 kHz samples whatever the input rate.
+        self._scale = 48000 // sample_rate
+        self._lookahead = self._encoder.lookahead
+        self._pending = np.empty(0, dtype=np.int16)
+        self._samples = 0
+        self._packets = 0
+        self._serial = random.getrandbits(32)
+        self._sequence = 0
+        self._started = False
+
+    def _page(self, packets: list, granule: int, flags: int = 0) -> bytes:
+        lacing = bytearray()
+        for packet in packets:
+            lacing += b"\xff" * (len(packet) // 255) + bytes([len(packet) % 255])
+        header = struct.pack("<4sBBqIII", b"OggS", 0, flags, granule, self._serial, self._sequence, 0)
+        page = bytearray(header + bytes([len(lacing)]) + lacing + b"".join(packets))
+        struct.pack_into("<I", page, 22, _ogg_crc(page))
+        self._sequence += 1
+        return bytes(page)
+
+    def _headers(self) -> bytes:
+        self._started = True
+        head = struct.pack("<8sBBHIhB", b"OpusHead", 1, 1, self._lookahead * self._scale, self._sample_rate, 0, 0)
+        vendor = b"echoverse"
+        tags = b"OpusTags" + struct.pack("<I", len(vendor)) + vendor + struct.pack("<I", 0)
+        return self._page([head], 0, flags=0x02) + self._page([tags], 0)
+
+    def _encode_frames(self, final: bool = False) -> bytes:
+        frames = len(self._pending) // self._frame
+        packets = [
+            self._encoder.encode(self._pending[i * self._frame:(i + 1) * self._frame].tobytes(), self._frame)
+            for i in range(frames)
+        ]
+        self._pending = self._pending[frames * self._frame:]
+        out = b"" if self._started else self._headers()
+        for start in range(0, len(packets), self._PACKETS_PER_PAGE):
+            page = packets[start:start + self._PACKETS_PER_PAGE]
+            self._packets += len(page)
+            last = final and start + self._PACKETS_PER_PAGE >= len(packets)
+            if last:
+                # The final granule trims the encoder delay and frame padding off the end.
+                granule = (self._lookahead + self._samples) * self._scale
+            else:
+                granule = self._packets * self._frame * self._scale
+            out += self._page(page, granule, flags=0x04 if last else 0)
+        if final and not packets:
+            out += self._page([], self._lookahead * self._scale, flags=0x04)
+        return out
+
+    def encode(self, pcm: np.ndarray) -> bytes:
+        pcm = pcm.astype(np.int16, copy=False)
+        self._samples += len(pcm)
+        self._pending = np.concatenate([self._pending, pcm])
+        return self._encode_frames()
+
+    def flush(self) -> bytes:
+        # Push the last input samples through the encoder delay, then pad to a whole frame.
+        tail = self._lookahead + (-(len(self._pending) + self._lookahead) % self._frame)
+        if self._samples:
+            self._pending = np.concatenate([self._pending, np.zeros(tail, dtype=np.int16)])
+        return self._encode_frames(final=True)
+
+class FFmpegPipeEncoder(AudioEncoder):
+    """
+    Feeds raw PCM into one ffmpeg process for the whole stream, instead of
+    spawning ffmpeg for every exported chunk. A reader thread drains stdout so
+    encoding overlaps with whatever produces the PCM. This is the fallback
+    when no in-process codec is installed; it still costs one ffmpeg process
+    per stream, and the pipeline opens a stream per segment.
+    """
+    _CODEC_ARGS = {
+        "mp3": ["-c:a", "libmp3lame", "-write_xing", "0", "-id3v2_version", "0", "-f", "mp3"],
+        "opus": ["-c:a", "libopus", "-application", "voip", "-f", "ogg"],
+    }
+
+    def __init__(self, fmt: str, sample_rate: int, bitrate: int):
+        from pydub import AudioSegment
+
+        cmd = [
+            AudioSegment.converter, "-hide_banner", "-loglevel", "error",
+            "-f", "s16le", "-ar", str(sample_rate), "-ac", "1", "-i", "pipe:0",
+            *self._CODEC_ARGS[fmt], "-b:a", f"{bitrate}k", "pipe:1",
+        ]
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self._chunks = []
+        self._lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _read(self) -> None:
+        for data in iter(lambda: self._proc.stdout.read1(65536), b""):
+            with self._lock:
+                self._chunks.append(data)
+
+    def _drain(self) -> bytes:
+        with self._lock:
+            data = b"".join(self._chunks)
+            self._chunks = []
+        return data
+
+    def encode(self, pcm: np.ndarray) -> bytes:
+        self._proc.stdin.write(pcm.astype(np.int16, copy=False).tobytes())
+        self._proc.stdin.flush()
+        return self._drain()
+
+    def flush(self) -> bytes:
+        self._proc.stdin.close()
+        self._reader.join()
+        stderr = self._proc.stderr.read()
+        if self._proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg encoder failed: {stderr.decode(errors='replace').strip()}")
+        return self._drain()
+
+    def close(self) -> None:
+        if self._proc.poll() is None:
+            self._proc.kill()
+            self._proc.wait()
+
+def make_encoder(sample_rate: int, fmt: Optional[str] = None) -> AudioEncoder:
+    """Returns an encoder for fmt (default: ECHOVERSE_AUDIO_FORMAT), preferring in-process codecs."""
+    fmt = fmt or AUDIO_FORMAT
+    bitrate = AUDIO_FORMATS[fmt][2]
+    if fmt == "mp3" and _HAS_LAMEENC:
+        return LameEncoder(sample_rate, bitrate)
+    if fmt == "opus" and _HAS_OPUSLIB and sample_rate in OggOpusEncoder.SAMPLE_RATES:
+        return OggOpusEncoder(sample_rate, bitrate)
+    return FFmpegPipeEncoder(fmt, sample_rate, bitrate)
@@ -0,0 +1,222 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from cache import make_key
+from metrics import traced
+
+# -------- Config --------
+JOB_WORKERS = int(os.environ.get("ECHOVERSE_JOB_WORKERS", 1))
+JOB_QUEUE_LIMIT = int(os.environ.get("ECHOVERSE_JOB_QUEUE_LIMIT", 8))
+JOB_HISTORY = 64  # finished jobs kept for polling
+# Finished jobs are also dropped once their results exceed this many bytes in total, or after this long
+JOB_HISTORY_BYTES = int(os.environ.get("ECHOVERSE_JOB_HISTORY_MB", 256)) * 1024 * 1024
+JOB_HISTORY_AGE_S = float(os.environ.get("ECHOVERSE_JOB_HISTORY_AGE_S", 3600))
+
+class QueueFullError(RuntimeError):
+    """Raised when too many jobs are already waiting or running."""
+
+class Job:
+    """
+    One rewrite + narration request. Fields are updated by the worker and read
+    via snapshot(). "audiobook" jobs render chapter files to disk instead of
+    keeping audio in memory, and report the combined file and chapter list.
+    """
+    def __init__(self, job_id: str, key: str, text: str, tone: str, voice_label: str, seed: Optional[int],
+                 kind: str = "narration"):
+        self.id = job_id
+        self.key = key
+        self.kind = kind
+        self.text = text
+        self.tone = tone
+        self.voice_label = voice_label
+        self.seed = seed
+        self.status = "queued"
+        self.progress = 0.0
+        self.rewritten_text = ""
+        self.audio_segments = []
+        self.output_path = None
+        self.chapters = []
+        self.current_chapter = ""
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.subscribers = 1  # submissions that resolved to this job and have not released it
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def result_bytes(self) -> int:
+        """Approximate memory held by the job's results."""
+        with self._lock:
+            return sum(len(segment) for segment in self.audio_segments) + len(self.rewritten_text)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "progress": self.progress,
+                "rewritten_text": self.rewritten_text,
+                "audio_segments": list(self.audio_segments),
+                "output_path": self.output_path,
+                "chapters": list(self.chapters),
+                "current_chapter": self.current_chapter,
+                "error": self.error,
+                "submitted_at": self.submitted_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+class JobManager:
+    """
+    Runs jobs on a bounded worker pool, independent of Streamlit reruns.
+    Workers share the process-wide models, and the pool size caps how many
+    requests use them at once. Identical in-flight (or recently finished)
+    requests resolve to the same job, and submissions beyond the queue limit
+    are rejected.
+    """
+    def __init__(self, max_workers: int = JOB_WORKERS, max_pending: int = JOB_QUEUE_LIMIT):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="echoverse-job")
+        self._jobs = OrderedDict()
+        self._by_key = {}
+        self._lock = threading.Lock()
+
+    def submit(self, text: str, tone: str, voice_label: str = "VoiceA", seed: Optional[int] = None,
+               kind: str = "narration") -> str:
+        from encoders import AUDIO_FORMAT
+        from pipeline import model_ids
+
+        # Audiobook output directories are named after the key, so a model or backend change starts afresh.
+        key = make_key(kind, text, tone, voice_label, seed, AUDIO_FORMAT, *model_ids())
+        with self._lock:
+            existing = self._jobs.get(self._by_key.get(key))
+            if existing is not None and existing.status != "failed":
+                existing.subscribers += 1
+                return existing.id
+
+            pending = sum(1 for job in self._jobs.values() if not job.finished)
+            if pending >= self.max_pending:
+                raise QueueFullError(f"{pending} jobs are already queued; try again shortly.")
+
+            job = Job(uuid.uuid4().hex[:12], key, text, tone, voice_label, seed, kind)
+            self._jobs[job.id] = job
+            self._by_key[key] = job.id
+            self._prune()
+        self._executor.submit(self._run, job)
+        return job.id
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def release(self, job_id: str) -> None:
+        """Forgets a finished job once every submission that resolved to it has taken the results."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.finished:
+                job.subscribers -= 1
+                if job.subscribers <= 0:
+                    self._forget(job)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return counts
+
+    def _forget(self, job: Job) -> None:
+        del self._jobs[job.id]
+        if self._by_key.get(job.key) == job.id:
+            del self._by_key[job.key]
+
+    def _prune(self) -> None:
+        """
+        Drops finished jobs older than JOB_HISTORY_AGE_S, then the oldest ones
+        until at most JOB_HISTORY remain holding at most JOB_HISTORY_BYTES.
+        """
+        now = time.time()
+        finished = [job for job in self._jobs.values() if job.finished]
+        kept = []
+        for job in finished:
+            if now - (job.finished_at or now) > JOB_HISTORY_AGE_S:
+                self._forget(job)
+            else:
+                kept.append(job)
+        sizes = [job.result_bytes() for job in kept]
+        total = sum(sizes)
+        for job, size in zip(kept, sizes):
+            if len(kept) <= JOB_HISTORY and total <= JOB_HISTORY_BYTES:
+                break
+            self._forget(job)
+            kept = kept[1:]
+            total -= size
+
+    @traced("job")
+    def _run(self, job: Job) -> None:
+        with job._lock:
+            job.status = "running"
+            job.started_at = time.time()
+        try:
+            if job.kind == "audiobook":
+                self._run_audiobook(job)
+            else:
+                self._run_narration(job)
+            with job._lock:
+                job.progress = 1.0
+                job.status = "done"
+        except Exception as e:
+            print(f"Job {job.id} failed: {e}")
+            with job._lock:
+                job.error = str(e)
+                job.status = "failed"
+        finally:
+            with job._lock:
+                job.finished_at = time.time()
+                # The source text is only needed to run the job.
+                job.text = ""
+            with self._lock:
+                self._prune()
+
+    def _run_narration(self, job: Job) -> None:
+        from pipeline import run_pipeline
+
+        for kind, payload in run_pipeline(job.text, job.tone, job.voice_label, seed=job.seed):
+            with job._lock:
+                if kind == "text":
+                    job.rewritten_text += payload
+                elif kind == "audio":
+                    job.audio_segments.append(payload)
+                elif kind == "progress":
+                    job.progress = payload
+        with job._lock:
+            job.rewritten_text = job.rewritten_text.strip()
+
+    def _run_audiobook(self, job: Job) -> None:
+        """Renders chapter by chapter into AUDIOBOOK_DIR/<key>, so a resubmitted book resumes its finished chapters."""
+        from audiobook import AUDIOBOOK_DIR, render_audiobook
+
+        def on_progress(done: int, total: int, chapter_title: str) -> None:
+            with job._lock:
+                job.progress = done / max(total, 1)
+                job.current_chapter = chapter_title
+
+        out_dir = Path(AUDIOBOOK_DIR) / job.key[:16]
+        manifest = render_audiobook(job.text, out_dir, job.tone, job.voice_label, job.seed, on_progress=on_progress)
+        with job._lock:
+            job.output_path = str(out_dir / manifest["combined"])
+            job.chapters = [
+                {"title": entry["title"], "duration_s": entry["duration_s"], "words": entry["words"]}
+                for entry in manifest["chapters"]
+            ]
@@ -0,0 +1,112 @@
+import os
+from typing import Callable, Dict, Tuple
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+# -------- Rewriter backends --------
+# A backend is a model id plus a loader returning (model, tokenizer) on the
+# given device. "cpu_only" backends always run on CPU, whatever the host has;
+# "chat_template" backends build prompts with the tokenizer's chat template.
+class LLMBackend:
+    def __init__(self, name: str, model_id: str, loader: Callable[[str, str], Tuple],
+                 cpu_only: bool = False, chat_template: bool = False):
+        self.name = name
+        self.model_id = model_id
+        self.loader = loader
+        self.cpu_only = cpu_only
+        self.chat_template = chat_template
+
+    def load(self, device: str) -> Tuple:
+        return self.loader(self.model_id, device)
+
+LLM_BACKENDS: Dict[str, LLMBackend] = {}
+
+def register_llm_backend(name: str, model_id: str, loader: Callable[[str, str], Tuple],
+                         cpu_only: bool = False, chat_template: bool = False) -> None:
+    LLM_BACKENDS[name] = LLMBackend(name, model_id, loader, cpu_only, chat_template)
+
+def _hf_token():
+    return os.environ.get("HUGGING_FACE_TOKEN")
+
+def _load_8bit(model_id: str, device: str) -> Tuple:
+    """fp16 weights with bitsandbytes 8-bit linears; needs a CUDA device."""
+    tokenizer = AutoTokenizer.from_pretrained(model_id, token=_hf_token())
+    model = AutoModelForCausalLM.from_pretrained(
+        model_id,
+        torch_dtype=torch.float16,
+        load_in_8bit=True,
+        token=_hf_token(),
+    )
+    return model, tokenizer
+
+def _load_fp32(model_id: str, device: str) -> Tuple:
+    tokenizer = AutoTokenizer.from_pretrained(model_id, token=_hf_token())
+    model = AutoModelForCausalLM.from_pretrained(model_id, torch_dtype=torch.float32, token=_hf_token())
+    return model.to(device).eval(), tokenizer
+
+def _load_int8_cpu(model_id: str, device: str) -> Tuple:
+    """Dynamic int8 quantization of the Linear layers: int8 weights, fp32 activations, CPU kernels."""
+    model, tokenizer = _load_fp32(model_id, "cpu")
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model, tokenizer
+
+# -------- Tiny offline model --------
+TINY_VOCAB_SPECIALS = ["<unk>", "<s>", "</s>", "<pad>"]
+
+def tiny_tokenizer():
+    """Byte-level tokenizer built in code (256 byte tokens, no merges), so no download is needed."""
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+    from transformers import PreTrainedTokenizerFast
+
+    alphabet = sorted(pre_tokenizers.ByteLevel.alphabet())
+    vocab = {token: i for i, token in enumerate(TINY_VOCAB_SPECIALS + alphabet)}
+    backend = Tokenizer(models.BPE(vocab=vocab, merges=[], unk_token="<unk>"))
+    backend.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    backend.decoder = decoders.ByteLevel()
+    return PreTrainedTokenizerFast(
+        tokenizer_object=backend,
+        unk_token="<unk>",
+        bos_token="<s>",
+        eos_token="</s>",
+        pad_token="<pad>",
+    )
+
+def _load_tiny(model_id: str, device: str) -> Tuple:
+    """
+    Randomly initialized two-layer Llama with a fixed seed. Its output is
+    gibberish, but it runs the whole rewrite path offline in milliseconds.
+    """
+    from transformers import LlamaConfig, LlamaForCausalLM
+
+    tokenizer = tiny_tokenizer()
+    config = LlamaConfig(
+        vocab_size=len(tokenizer),
+        hidden_size=64,
+        intermediate_size=128,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_key_value_heads=4,
+        max_position_embeddings=4096,
+        bos_token_id=tokenizer.bos_token_id,
+        eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.pad_token_id,
+    )
+    generator_state = torch.random.get_rng_state()
+    torch.manual_seed(0)
+    model = LlamaForCausalLM(config)
+    torch.random.set_rng_state(generator_state)
+    return model.to(device).eval(), tokenizer
+
+SMALL_MODEL_ID = os.environ.get("ECHOVERSE_LLM_SMALL_MODEL", "Qwen/Qwen2.5-0.5B-Instruct")
+
+register_llm_backend("mistral-8bit", "mistralai/Mistral-7B-Instruct-v0.2", _load_8bit)
+register_llm_backend("cpu-small", SMALL_MODEL_ID, _load_fp32, chat_template=True)
+register_llm_backend("cpu-int8", SMALL_MODEL_ID, _load_int8_cpu, cpu_only=True, chat_template=True)
+register_llm_backend("tiny", "echoverse/tiny-random-llama", _load_tiny)
+
+def resolve_llm_backend(name: str) -> LLMBackend:
+    """Maps "auto" (or an unknown name) to the 8-bit Mistral on CUDA hosts and the int8 small model on CPU."""
+    if name == "auto" or name not in LLM_BACKENDS:
+        name = "mistral-8bit" if torch.cuda.is_available() else "cpu-int8"
+    return LLM_BACKENDS[name]
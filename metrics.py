@@ -0,0 +1,173 @@
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable
+
+import numpy as np
+
+# -------- Config --------
+METRICS_WINDOW = int(os.environ.get("ECHOVERSE_METRICS_WINDOW", 512))  # recent samples per stage for percentiles
+METRICS_FILE = os.environ.get("ECHOVERSE_METRICS_FILE")  # *.prom -> Prometheus text, anything else -> JSON
+METRICS_INTERVAL_S = float(os.environ.get("ECHOVERSE_METRICS_INTERVAL_S", 15))
+TRACE_HISTORY = 50  # finished request traces kept for display
+
+_QUANTILES = (0.5, 0.95, 0.99)
+_current_trace: ContextVar = ContextVar("echoverse_trace", default=None)
+
+class _StageStats:
+    def __init__(self, window: int):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+class Tracer:
+    """
+    Lightweight stage timer. span() records how long a named stage took;
+    traced() groups the spans of one request (including those recorded in
+    threads started with its context) into a trace. Per-stage percentiles are
+    computed over the last METRICS_WINDOW samples; counts and sums are totals.
+    """
+    def __init__(self, window: int = METRICS_WINDOW):
+        self.window = window
+        self._stages = {}
+        self._traces = deque(maxlen=TRACE_HISTORY)
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self._exporter = None
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = self._stages[stage] = _StageStats(self.window)
+            stats.samples.append(seconds)
+            stats.count += 1
+            stats.total += seconds
+            trace = _current_trace.get()
+            if trace is not None:
+                trace["spans"].append((stage, round(seconds * 1000, 2)))
+        if METRICS_FILE:
+            self._ensure_exporter()
+
+    @contextmanager
+    def span(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def traced(self, name: str):
+        """Decorator: runs the function as one request trace (nested calls join the outer trace)."""
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if _current_trace.get() is not None:
+                    with self.span(name):
+                        return fn(*args, **kwargs)
+                trace = {"id": uuid.uuid4().hex[:12], "name": name, "started_at": time.time(), "spans": []}
+                token = _current_trace.set(trace)
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    seconds = time.perf_counter() - start
+                    _current_trace.reset(token)
+                    trace["duration_ms"] = round(seconds * 1000, 2)
+                    self.record(name, seconds)
+                    with self._lock:
+                        self._traces.append(trace)
+            return wrapper
+        return decorate
+
+    def summary(self) -> dict:
+        """stage -> count, total seconds and mean/p50/p95/p99 milliseconds."""
+        with self._lock:
+            stages = {name: (list(s.samples), s.count, s.total) for name, s in self._stages.items()}
+        result = {}
+        for name, (samples, count, total) in sorted(stages.items()):
+            ms = np.asarray(samples) * 1000
+            row = {"count": count, "total_s": round(total, 6), "mean_ms": round(float(ms.mean()), 2)}
+            for q, value in zip(_QUANTILES, np.percentile(ms, [q * 100 for q in _QUANTILES])):
+                row[f"p{int(q * 100)}_ms"] = round(float(value), 2)
+            result[name] = row
+        return result
+
+    def register_gauges(self, name: str, read: Callable[[], dict]) -> None:
+        """Publishes point-in-time values under name; read() returns {metric: number} and is called on demand."""
+        with self._lock:
+            self._gauges[name] = read
+
+    def gauges(self) -> dict:
+        with self._lock:
+            readers = sorted(self._gauges.items())
+        return {name: read() for name, read in readers}
+
+    def recent_traces(self, limit: int = 10) -> list:
+        with self._lock:
+            return [dict(trace, spans=list(trace["spans"])) for trace in list(self._traces)[-limit:]][::-1]
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {"stages": self.summary(), "gauges": self.gauges(), "traces": self.recent_traces(TRACE_HISTORY)},
+            indent=2,
+        )
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition: one summary metric labelled by stage, plus the registered gauges."""
+        lines = [
+            "# HELP echoverse_stage_seconds Stage latency (quantiles over the recent window).",
+            "# TYPE echoverse_stage_seconds summary",
+        ]
+        for name, row in self.summary().items():
+            for q in _QUANTILES:
+                value = row[f"p{int(q * 100)}_ms"] / 1000
+                lines.append(f'echoverse_stage_seconds{{stage="{name}",quantile="{q}"}} {value:.6f}')
+            lines.append(f'echoverse_stage_seconds_sum{{stage="{name}"}} {row["total_s"]:.6f}')
+            lines.append(f'echoverse_stage_seconds_count{{stage="{name}"}} {row["count"]}')
+        for name, values in self.gauges().items():
+            for key, value in values.items():
+                lines.append(f"# TYPE echoverse_{name}_{key} gauge")
+                lines.append(f"echoverse_{name}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str) -> None:
+        """Writes the metrics to path atomically, as Prometheus text for *.prom and JSON otherwise."""
+        data = self.to_prometheus() if path.endswith(".prom") else self.to_json()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def _ensure_exporter(self) -> None:
+        if self._exporter is None:
+            with self._lock:
+                if self._exporter is None:
+                    self._exporter = threading.Thread(target=self._export_loop, name="metrics-export", daemon=True)
+                    self._exporter.start()
+
+    def _export_loop(self) -> None:
+        while True:
+            time.sleep(METRICS_INTERVAL_S)
+            try:
+                self.export(METRICS_FILE)
+            except Exception as e:
+                print(f"Metrics export failed: {e}")
+
+TRACER = Tracer()
+span = TRACER.span
+traced = TRACER.traced
@@ -0,0 +1,207 @@
+import re
+from functools import lru_cache
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from num2words import num2words
+
+# -------- Number verbalization --------
+_DIGIT_WORDS = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine"]
+
+_CURRENCIES = {
+    "$": ("dollar", "dollars", "cent", "cents"),
+    "£": ("pound", "pounds", "penny", "pence"),
+    "€": ("euro", "euros", "cent", "cents"),
+}
+
+@lru_cache(maxsize=4096)
+def verbalize_number(value: int, to: str = "cardinal") -> str:
+    """Memoized num2words for integers ('cardinal', 'ordinal' or 'year')."""
+    return num2words(value, to=to)
+
+def _to_int(digits: str) -> int:
+    return int(digits.replace(",", ""))
+
+def _decimal_words(number: str) -> str:
+    whole, _, fraction = number.partition(".")
+    words = verbalize_number(_to_int(whole))
+    if fraction:
+        words += " point " + " ".join(_DIGIT_WORDS[int(d)] for d in fraction)
+    return words
+
+# -------- Rule handlers --------
+_CURRENCY_RE = re.compile(r"([$£€])(\d{1,3}(?:,\d{3})+|\d+)(?:\.(\d{1,2}))?")
+_CURRENCY_MAGNITUDE_RE = re.compile(r"([$£€])([\d,]+(?:\.\d+)?)(K|M|B|bn)")
+_MAGNITUDES = {"K": "thousand", "M": "million", "B": "billion", "bn": "billion"}
+_ORDINAL_RE = re.compile(r"(\d+)(?:st|nd|rd|th)", re.IGNORECASE)
+
+def _currency(token: str) -> str:
+    symbol, whole, fraction = _CURRENCY_RE.fullmatch(token).groups()
+    unit, units, sub, subs = _CURRENCIES[symbol]
+    amount = _to_int(whole)
+    cents = int(fraction.ljust(2, "0")) if fraction else 0
+
+    parts = []
+    if amount or not cents:
+        parts.append(f"{verbalize_number(amount)} {unit if amount == 1 else units}")
+    if cents:
+        parts.append(f"{verbalize_number(cents)} {sub if cents == 1 else subs}")
+    return " and ".join(parts)
+
+def _currency_magnitude(token: str) -> str:
+    symbol, number, magnitude = _CURRENCY_MAGNITUDE_RE.fullmatch(token).groups()
+    return f"{_decimal_words(number)} {_MAGNITUDES[magnitude]} {_CURRENCIES[symbol][1]}"
+
+def _with_unit(token: str) -> str:
+    """A number written against its unit ("2.5kg"): spoken with a space before the unit."""
+    return _decimal_words(token) + " "
+
+def _percent(token: str) -> str:
+    return _decimal_words(token[:-1]) + " percent"
+
+def _ordinal(token: str) -> str:
+    return verbalize_number(int(_ORDINAL_RE.fullmatch(token).group(1)), to="ordinal")
+
+def _year(token: str) -> str:
+    return verbalize_number(int(token), to="year")
+
+def _decade(token: str) -> str:
+    words = _year(token[:-1])
+    return words[:-1] + "ies" if words.endswith("y") else words + "s"
+
+def _cardinal(token: str) -> str:
+    return verbalize_number(_to_int(token))
+
+def _replace_with(text: str) -> Callable[[str], str]:
+    return lambda token: text
+
+# A four-digit number is only read as a year in a year context ("in 1999",
+# "June 1944", "AD 1066", "44 BC", "the 1990s"); elsewhere it is a cardinal
+# ("2048 bytes"). Context is matched with look-arounds, so tokens stay single words.
+_YEAR_CONTEXT_WORDS = ("in", "since", "by", "until", "till", "during", "circa")
+_MONTHS = ("January", "February", "March", "April", "May", "June", "July",
+           "August", "September", "October", "November", "December")
+_YEAR_CONTEXT = "(?:" + "|".join(
+    [rf"(?<=\b(?i:{word})\s)" for word in _YEAR_CONTEXT_WORDS]
+    + [rf"(?<=\b{month}\s)" for month in _MONTHS]
+) + ")"
+_ERA = r"(?=\s?(?:AD|BC|BCE|CE)\b)"
+# A number ends where no digit (or decimal part) follows; units or a full stop may.
+_NUMBER_END = r"(?!\d|\.\d)"
+
+# Ordered (pattern, handler) pairs. At each position the first matching rule wins,
+# so more specific number shapes come before the generic ones. Rules may look at
+# the text around their token (normalize_stream keeps enough of it).
+DEFAULT_RULES: List[Tuple[str, Callable[[str], str]]] = [
+    (r"[$£€](?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?(?:K|M|B|bn)\b", _currency_magnitude),
+    (r"[$£€]\d{1,3}(?:,\d{3})+(?:\.\d{1,2})?" + _NUMBER_END + r"|[$£€]\d+(?:\.\d{1,2})?" + _NUMBER_END, _currency),
+    (r"\d+(?:\.\d+)?%", _percent),
+    (r"\b\d+(?:st|nd|rd|th)\b", _ordinal),
+    (r"\b(?:1[1-9]|20)\d0s\b", _decade),
+    (r"\b\d{1,4}" + _ERA + r"|(?<=\bAD\s)\d{1,4}\b", _year),
+    (r"\b(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?(?=[A-Za-z])", _with_unit),
+    (r"\b\d+\.\d+" + _NUMBER_END, _decimal_words),
+    (r"\b\d{1,3}(?:,\d{3})+\b", _cardinal),
+    (_YEAR_CONTEXT + r"(?:1[1-9]|20)\d\d\b", _year),
+    (r"\d+", _cardinal),
+    (r"\bSt\.", _replace_with("Street")),
+    (r"\bMr\.", _replace_with("Mister")),
+    (r"\bMrs\.", _replace_with("Missus")),
+    (r"\bDr\.", _replace_with("Doctor")),
+    (r"\s*&\s*", _replace_with(" and ")),
+    (r"\s+", _replace_with(" ")),
+]
+
+# Start of the whitespace before the last complete word (one that is followed by
+# whitespace): text up to here can be normalized, since any look-ahead can see a word.
+_STREAM_CUT_RE = re.compile(r"\s+\S+\s+\S*$")
+_STREAM_CONTEXT_CHARS = 32  # raw text kept before the cut, for look-behinds
+
+class TextNormalizer:
+    """
+    Rule-table text normalizer for TTS. All rules are compiled into a single
+    alternation pattern, so a document is normalized in one tokenizing pass.
+    """
+    def __init__(self, rules: Optional[List[Tuple[str, Callable[[str], str]]]] = None):
+        self.rules = list(DEFAULT_RULES if rules is None else rules)
+        self._compile()
+
+    def _compile(self) -> None:
+        alternation = "|".join(f"(?P<r{i}>{pattern})" for i, (pattern, _) in enumerate(self.rules))
+        self._pattern = re.compile(alternation)
+        self._handlers = {f"r{i}": handler for i, (_, handler) in enumerate(self.rules)}
+
+    def add_rule(self, pattern: str, handler: Callable[[str], str], first: bool = True) -> None:
+        """Registers a rule; by default it takes precedence over the existing ones."""
+        if first:
+            self.rules.insert(0, (pattern, handler))
+        else:
+            self.rules.append((pattern, handler))
+        self._compile()
+
+    def _dispatch(self, match: re.Match) -> str:
+        return self._handlers[match.lastgroup](match.group(0))
+
+    def _normalize_range(self, text: str, start: int, end: int) -> Tuple[str, int]:
+        """
+        Normalizes text[start:end], letting rules look behind start and ahead of
+        end. Stops before a token that would cross end; returns the normalized
+        text and the position it stopped at.
+        """
+        parts, pos = [], start
+        for match in self._pattern.finditer(text, start):
+            if match.start() >= end:
+                break
+            if match.end() > end:
+                end = match.start()
+                break
+            parts.append(text[pos:match.start()])
+            parts.append(self._dispatch(match))
+            pos = match.end()
+        parts.append(text[pos:end])
+        return "".join(parts), end
+
+    def normalize(self, text: str) -> str:
+        return self._pattern.sub(self._dispatch, text).strip()
+
+    def normalize_stream(self, chunks: Iterable[str]) -> Iterator[str]:
+        """
+        Normalizes an iterable of text chunks (e.g. lines of a large file)
+        incrementally, with the same result as normalize() on the joined text.
+        Input is cut at whitespace followed by one complete word, so rule
+        look-aheads see the next word; a little raw text is kept before the cut
+        for look-behinds. Spacing between pieces is collapsed as in normalize().
+        """
+        text, pos = "", 0  # raw text not yet discarded, and how much of it is normalized
+        started = False
+        pending_space = False
+
+        def emit(normalized: str):
+            nonlocal started, pending_space
+            body = normalized.strip()
+            if not body:
+                pending_space = pending_space or bool(normalized)
+                return None
+            lead = " " if started and (pending_space or normalized[0].isspace()) else ""
+            started = True
+            pending_space = normalized[-1].isspace()
+            return lead + body
+
+        for chunk in chunks:
+            text += chunk
+            match = _STREAM_CUT_RE.search(text, pos)
+            if not match or match.start() <= pos:
+                continue
+            normalized, pos = self._normalize_range(text, pos, match.start())
+            trim = max(0, pos - _STREAM_CONTEXT_CHARS)
+            text, pos = text[trim:], pos - trim
+            piece = emit(normalized) if normalized else None
+            if piece:
+                yield piece
+
+        if pos < len(text):
+            normalized, _ = self._normalize_range(text, pos, len(text))
+            piece = emit(normalized)
+            if piece:
+                yield piece
+
+default_normalizer = TextNormalizer()
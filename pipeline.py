@@ -0,0 +1,248 @@
+import contextvars
+import queue
+import re
+import threading
+from typing import Iterator, Optional, Tuple
+
+from rewriter import LLM_BACKEND, LLM_ERROR_MESSAGE, LLM_MIN_WORDS, MISTRAL_MODEL_ID, hybrid_rewrite_stream, rewrite_deadline
+import tts
+
+# -------- Config --------
+STAGE_QUEUE_SIZE = 2    # items buffered between stages (backpressure)
+SEGMENT_WORDS = 150     # target words per pipeline segment
+
+_PARAGRAPH_RE = re.compile(r'\n\s*\n')
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+_DONE = object()
+
+class _Stopped(Exception):
+    pass
+
+def model_ids() -> tuple:
+    """The rewriter and TTS model/backend ids, for keys of outputs that must be redone when they change."""
+    return LLM_BACKEND.name, MISTRAL_MODEL_ID, tts.HF_MODEL_ID, tts.TTS_BACKEND
+
+def split_segments(text: str, max_words: int = SEGMENT_WORDS, min_words: int = LLM_MIN_WORDS) -> list:
+    """
+    Splits text into paragraph-aligned segments of roughly max_words.
+    A segment is only closed once it has min_words, and a short tail is merged
+    into the previous segment, so hybrid routing stays the same for every segment
+    of a long document.
+    """
+    units = []
+    for paragraph in _PARAGRAPH_RE.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph.split()) <= max_words:
+            units.append((paragraph, True))
+        else:
+            sentences = [s for s in _SENTENCE_RE.split(paragraph) if s.strip()]
+            units.extend((sentence, i == 0) for i, sentence in enumerate(sentences))
+
+    segments = []
+    current, current_words = "", 0
+    for unit, starts_paragraph in units:
+        words = len(unit.split())
+        if current and current_words >= min_words and current_words + words > max_words:
+            segments.append(current)
+            current, current_words = "", 0
+        if current:
+            current += ("\n\n" if starts_paragraph else " ") + unit
+        else:
+            current = unit
+        current_words += words
+    if current:
+        if segments and current_words < min_words:
+            segments[-1] += "\n\n" + current
+        else:
+            segments.append(current)
+    return segments
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> None:
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+    raise _Stopped()
+
+def _get(q: queue.Queue, stop: threading.Event):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    raise _Stopped()
+
+def _stage(target):
+    """Runs a stage body, reporting failures as an 'error' event and stopping the pipeline."""
+    def run(events: queue.Queue, stop: threading.Event, *args):
+        try:
+            target(events, stop, *args)
+        except _Stopped:
+            pass
+        except Exception as e:
+            events.put(("error", e))
+            stop.set()
+    return run
+
+@_stage
+def _rewrite_stage(events, stop, segments, tone, seed, deadline, strict, text_q):
+    for i, segment in enumerate(segments):
+        if i > 0:
+            events.put(("text", "\n\n"))
+        pieces = []
+        stream = hybrid_rewrite_stream(segment, tone, seed=seed, deadline=deadline)
+        try:
+            for piece in stream:
+                # Another stage failed or the consumer left: stop generating now.
+                if stop.is_set():
+                    raise _Stopped()
+                pieces.append(piece)
+                events.put(("text", piece))
+        finally:
+            stream.close()
+        rewritten = "".join(pieces).strip()
+        if strict and LLM_ERROR_MESSAGE in rewritten:
+            raise RuntimeError("LLM rewrite failed")
+        _put(text_q, rewritten, stop)
+    _put(text_q, _DONE, stop)
+
+@_stage
+def _synthesis_stage(events, stop, voice_label, strict, text_q, audio_q):
+    first = True
+    while True:
+        text = _get(text_q, stop)
+        if text is _DONE:
+            break
+        if not text:
+            _put(audio_q, ("end", None), stop)
+            continue
+
+        preprocessed = tts.preprocess_text(text)
+        # Segments after the first start with a pause, so they are cached apart from unpaused ones.
+        cache_key = tts.audio_cache_key(preprocessed, voice_label, 1.0, variant="stream" if first else "stream+pause")
+        cached = tts.AUDIO_CACHE.get(cache_key)
+        if cached:
+            _put(audio_q, ("encoded", cached), stop)
+            _put(audio_q, ("end", None), stop)
+            first = False
+            continue
+
+        try:
+            chunks = tts.chunk_text(preprocessed)
+        except Exception as e:
+            print(f"Hugging Face TTS failed: {e}")
+            chunks = None
+
+        if chunks:
+            sample_rate = tts.HF_MODEL.config.sampling_rate
+            for wav in tts.iter_waveforms(chunks, leading_pause=not first):
+                _put(audio_q, ("wav", (wav, sample_rate)), stop)
+            _put(audio_q, ("end", cache_key), stop)
+        else:
+            _put(audio_q, ("encoded", tts.synthesize_bytes(text, voice_label, allow_silence=not strict)), stop)
+            _put(audio_q, ("end", None), stop)
+        first = False
+    _put(audio_q, _DONE, stop)
+
+@_stage
+def _encode_stage(events, stop, audio_q):
+    # Each pipeline segment is one encoder stream (one complete file), so a
+    # segment can be cached and reused on its own.
+    encoder = None
+    encoded = []
+    try:
+        while True:
+            item = _get(audio_q, stop)
+            if item is _DONE:
+                break
+            kind, payload = item
+            if kind == "end":
+                if encoder is not None:
+                    data = encoder.flush()
+                    encoder = None
+                    encoded.append(data)
+                    events.put(("audio", data))
+                # Cache each fully synthesized segment under the key its synthesis stage chose.
+                if payload is not None and encoded:
+                    tts.AUDIO_CACHE.put(payload, b"".join(encoded))
+                encoded = []
+                events.put(("segment", None))
+                continue
+            if kind == "encoded":
+                data = payload
+            else:
+                wav, sample_rate = payload
+                if encoder is None:
+                    encoder = tts.WaveformEncoder()
+                data = encoder.encode(wav, sample_rate)
+            if data:
+                encoded.append(data)
+                events.put(("audio", data))
+    finally:
+        if encoder is not None:
+            encoder.close()
+    events.put(("done", None))
+
+def run_pipeline(
+    text: str,
+    tone: str,
+    voice_label: str = "VoiceA",
+    seed: Optional[int] = None,
+    strict: bool = False,
+) -> Iterator[Tuple[str, object]]:
+    """
+    Rewrites, synthesizes and encodes text as three overlapped stages joined by
+    bounded queues: while segment N is being synthesized, segment N+1 is being
+    rewritten and segment N-1 encoded.
+
+    Yields ("text", str) events as rewritten text streams in, ("audio", bytes)
+    events with encoded audio in reading order, and ("progress", float) events
+    with the fraction of segments fully encoded. Every pipeline segment is a
+    complete stream, so for MP3 b"".join of all audio payloads is one playable
+    file (Ogg/Opus yields a chained Ogg stream). Stage failures are re-raised here.
+    All segments' LLM rewrites share one latency budget (LLM_LATENCY_BUDGET_S).
+    With strict, a failed LLM rewrite or a silent TTS fallback is raised as an
+    error instead of being narrated, for renders that are kept on disk.
+    """
+    segments = split_segments(text)
+    if not segments:
+        return
+
+    # One deadline per request; later segments fall back to rules once it is spent.
+    deadline = rewrite_deadline()
+
+    events = queue.Queue()
+    stop = threading.Event()
+    text_q = queue.Queue(maxsize=STAGE_QUEUE_SIZE)
+    audio_q = queue.Queue(maxsize=STAGE_QUEUE_SIZE)
+    # Stages run in copies of the caller's context, so their timing spans join its trace.
+    stages = [
+        threading.Thread(target=contextvars.copy_context().run, args=(stage, events, stop, *args), daemon=True)
+        for stage, args in (
+            (_rewrite_stage, (segments, tone, seed, deadline, strict, text_q)),
+            (_synthesis_stage, (voice_label, strict, text_q, audio_q)),
+            (_encode_stage, (audio_q,)),
+        )
+    ]
+    for stage in stages:
+        stage.start()
+
+    finished = 0
+    try:
+        while True:
+            kind, payload = events.get()
+            if kind == "error":
+                raise payload
+            if kind == "done":
+                break
+            if kind == "segment":
+                finished += 1
+                yield "progress", finished / len(segments)
+                continue
+            yield kind, payload
+    finally:
+        stop.set()
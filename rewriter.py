@@ -1,14 +1,61 @@
 import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM
+from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
 import os
+import contextvars
+import copy
 import random
 import re
-from typing import Optional
+import hashlib
+import threading
+import time
+from typing import Iterator, Optional
+
+from cache import DiskCache, LRUCache, make_key
+from llm_backends import resolve_llm_backend
+from metrics import span, traced
+
+# Rewriter backend: auto | mistral-8bit | cpu-small | cpu-int8 | tiny
+LLM_BACKEND = resolve_llm_backend(os.environ.get("ECHOVERSE_LLM_BACKEND", "auto"))
 
 # Global caches for the LLM model
 MISTRAL_TOKENIZER = None
 MISTRAL_MODEL = None
-MISTRAL_DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+MISTRAL_DEVICE = "cuda" if torch.cuda.is_available() and not LLM_BACKEND.cpu_only else "cpu"
+MISTRAL_MODEL_ID = LLM_BACKEND.model_id
+_LLM_LOAD_LOCK = threading.Lock()
+
+LLM_ERROR_MESSAGE = "An error occurred during text rewriting. Please try again."
+
+# Texts shorter than this go to the rule-based rewriter
+LLM_MIN_WORDS = 50
+
+# Chunked rewriting: prompt tokens per chunk, chunks per generate() call, output cap per chunk
+LLM_CHUNK_TOKENS = 384
+LLM_BATCH_SIZE = 4
+LLM_MAX_NEW_TOKENS = 1024
+
+# Reuse the per-tone prompt prefix's past-key-values instead of re-encoding it on every call
+LLM_PROMPT_CACHE = os.environ.get("ECHOVERSE_LLM_PROMPT_CACHE", "1") != "0"
+
+# Wall-clock budget for one LLM rewrite in seconds (0 = unbounded), and the
+# expected output/input token ratio used to predict generation time
+LLM_LATENCY_BUDGET_S = float(os.environ.get("ECHOVERSE_LLM_LATENCY_BUDGET_S", 45))
+LLM_OUTPUT_RATIO = 1.3
+
+_PARAGRAPH_RE = re.compile(r'\n\s*\n')
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+
+# Rewrite-result cache: in-memory LRU, plus an on-disk tier when a directory is configured
+REWRITE_CACHE = LRUCache(max_entries=int(os.environ.get("ECHOVERSE_REWRITE_CACHE_ENTRIES", 256)))
+REWRITE_DISK_CACHE = (
+    DiskCache(
+        os.environ["ECHOVERSE_REWRITE_CACHE_DIR"],
+        max_bytes=int(os.environ.get("ECHOVERSE_REWRITE_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+        suffix=".txt",
+    )
+    if os.environ.get("ECHOVERSE_REWRITE_CACHE_DIR")
+    else None
+)
 
 class ToneBasedTextRewriter:
     """Advanced text rewriting engine with multiple tone adaptations"""
@@ -70,24 +117,44 @@ class ToneBasedTextRewriter:
                 "The findings demonstrated clear patterns."
             ]
         }
+        
+        # Compile each tone's vocabulary into one alternation pattern plus a
+        # lowercase lookup table, so a document is rewritten in a single scan.
+        self.vocabulary_patterns = {}
+        for tone, vocab_map in self.vocabulary_maps.items():
+            lookup = {original.lower(): replacements for original, replacements in vocab_map.items()}
+            alternation = "|".join(re.escape(word) for word in sorted(lookup, key=len, reverse=True))
+            pattern = re.compile(r'\b(?:' + alternation + r')\b', flags=re.IGNORECASE)
+            self.vocabulary_patterns[tone] = (pattern, lookup)
     
-    def transform_vocabulary(self, text: str, tone: str) -> str:
-        """Transform vocabulary based on tone"""
-        if tone not in self.vocabulary_maps:
+    @staticmethod
+    def _match_case(replacement: str, original: str) -> str:
+        """Carry the capitalization of the matched word over to its replacement"""
+        if len(original) > 1 and original.isupper():
+            return replacement.upper()
+        if original[0].isupper():
+            return replacement[0].upper() + replacement[1:]
+        return replacement
+    
+    def transform_vocabulary(self, text: str, tone: str, rng=random) -> str:
+        """Transform vocabulary based on tone in one pass over the text"""
+        if tone not in self.vocabulary_patterns:
             return text
         
-        vocab_map = self.vocabulary_maps[tone]
-        result = text
+        pattern, lookup = self.vocabulary_patterns[tone]
+        # One replacement is drawn per vocabulary word and reused for every occurrence.
+        chosen = {}
         
-        for original, replacements in vocab_map.items():
-            if original in result:
-                replacement = random.choice(replacements)
-                pattern = r'\b' + re.escape(original) + r'\b'
-                result = re.sub(pattern, replacement, result, flags=re.IGNORECASE)
+        def substitute(match):
+            original = match.group(0)
+            key = original.lower()
+            if key not in chosen:
+                chosen[key] = rng.choice(lookup[key])
+            return self._match_case(chosen[key], original)
         
-        return result
+        return pattern.sub(substitute, text)
     
-    def restructure_for_tone(self, text: str, tone: str) -> str:
+    def restructure_for_tone(self, text: str, tone: str, rng=random) -> str:
         """Restructure sentences based on tone"""
         sentences = [s.strip() for s in re.split(r'[.!?]+', text) if s.strip()]
         
@@ -97,18 +164,18 @@ class ToneBasedTextRewriter:
             enhanced_sentences = []
             
             for i, sentence in enumerate(sentences):
-                if i > 0 and random.random() < 0.4:
-                    sentence = f"{random.choice(connectors)}, {sentence}"
+                if i > 0 and rng.random() < 0.4:
+                    sentence = f"{rng.choice(connectors)}, {sentence}"
                 
                 # Add dramatic pauses occasionally
-                if random.random() < 0.3 and len(sentence) > 20:
+                if rng.random() < 0.3 and len(sentence) > 20:
                     sentence = sentence + "..."
                     
                 enhanced_sentences.append(sentence)
                 
                 # Add atmospheric sentence occasionally
-                if random.random() < 0.25:
-                    enhanced_sentences.append(random.choice(self.sentence_enhancers["Suspenseful"]))
+                if rng.random() < 0.25:
+                    enhanced_sentences.append(rng.choice(self.sentence_enhancers["Suspenseful"]))
                     
         elif tone == "Inspiring":
             # Add motivational connectors and uplifting elements
@@ -116,33 +183,35 @@ class ToneBasedTextRewriter:
             enhanced_sentences = []
             
             for i, sentence in enumerate(sentences):
-                if i > 0 and random.random() < 0.3:
-                    sentence = f"{random.choice(connectors)}, {sentence}"
+                if i > 0 and rng.random() < 0.3:
+                    sentence = f"{rng.choice(connectors)}, {sentence}"
                 
                 enhanced_sentences.append(sentence)
                 
                 # Add inspiring sentence occasionally
-                if random.random() < 0.3:
-                    enhanced_sentences.append(random.choice(self.sentence_enhancers["Inspiring"]))
+                if rng.random() < 0.3:
+                    enhanced_sentences.append(rng.choice(self.sentence_enhancers["Inspiring"]))
                     
         else:  # Neutral
             enhanced_sentences = sentences
             # Add professional connectors occasionally
-            if random.random() < 0.2:
-                enhanced_sentences.append(random.choice(self.sentence_enhancers["Neutral"]))
+            if rng.random() < 0.2:
+                enhanced_sentences.append(rng.choice(self.sentence_enhancers["Neutral"]))
         
         return enhanced_sentences
     
-    def rewrite_text(self, text: str, tone: str) -> str:
-        """Main rewriting function"""
+    def rewrite_text(self, text: str, tone: str, seed: Optional[int] = None) -> str:
+        """Main rewriting function. A seed makes the output reproducible."""
         if not text.strip():
             return ""
         
+        rng = random.Random(seed) if seed is not None else random
+        
         # Transform vocabulary
-        transformed = self.transform_vocabulary(text, tone)
+        transformed = self.transform_vocabulary(text, tone, rng)
         
         # Restructure sentences
-        sentences = self.restructure_for_tone(transformed, tone)
+        sentences = self.restructure_for_tone(transformed, tone, rng)
         
         # Capitalize and join
         capitalized_sentences = []
@@ -163,26 +232,48 @@ class ToneBasedTextRewriter:
 # Initialize the rule-based rewriter
 rule_based_rewriter = ToneBasedTextRewriter()
 
-def rewrite_with_llm(text: str, tone: str) -> str:
-    """LLM-based rewriting function using the Mistral model."""
+def load_llm() -> None:
+    """Loads the configured rewriter model once; safe to call from a warm-up thread."""
     global MISTRAL_TOKENIZER, MISTRAL_MODEL
-    
-    if not text.strip():
-        return ""
 
-    try:
-        if MISTRAL_TOKENIZER is None:
-            print("Loading Mistral model...")
-            model_name = "mistralai/Mistral-7B-Instruct-v0.2"
-            MISTRAL_TOKENIZER = AutoTokenizer.from_pretrained(model_name)
-            MISTRAL_MODEL = AutoModelForCausalLM.from_pretrained(
-                model_name,
-                torch_dtype=torch.float16,
-                load_in_8bit=True,
-                token=os.environ.get("HUGGING_FACE_TOKEN")
-            )
-        
-        prompt_template = f"""
+    if MISTRAL_MODEL is not None:
+        return
+    with _LLM_LOAD_LOCK:
+        if MISTRAL_MODEL is None:
+            print(f"Loading rewriter model ({LLM_BACKEND.name}: {MISTRAL_MODEL_ID})...")
+            with span("rewrite.model_load"):
+                model, tokenizer = LLM_BACKEND.load(MISTRAL_DEVICE)
+            # Decoder-only batches must be left-padded so every prompt ends where generation starts.
+            tokenizer.padding_side = "left"
+            if tokenizer.pad_token is None:
+                tokenizer.pad_token = tokenizer.eos_token
+            MISTRAL_TOKENIZER = tokenizer
+            MISTRAL_MODEL = model
+
+_SYSTEM_PROMPT = (
+    "You are a helpful assistant that rewrites text to a specific tone. "
+    "The user will provide you with a tone and a piece of text. "
+    "You must rewrite the text using descriptive language and without summarizing the original content. "
+    "The tone should be {tone}."
+)
+
+_REQUEST = "Rewrite the following text: "
+_TEXT_SLOT = "\x00ECHOVERSE_TEXT\x00"
+
+def _prompt_parts(tone: str) -> tuple:
+    """
+    Splits the prompt around the user's request into a per-tone prefix
+    (system preamble up to the user turn) and the closing text after it.
+    """
+    if LLM_BACKEND.chat_template:
+        messages = [
+            {"role": "system", "content": _SYSTEM_PROMPT.format(tone=tone)},
+            {"role": "user", "content": _TEXT_SLOT},
+        ]
+        rendered = MISTRAL_TOKENIZER.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        prefix, after = rendered.split(_TEXT_SLOT)
+        return prefix, after
+    prefix = f"""
             <|system|>
             You are a helpful assistant that rewrites text to a specific tone.
             The user will provide you with a tone and a piece of text.
@@ -190,46 +281,487 @@ def rewrite_with_llm(text: str, tone: str) -> str:
             The tone should be {tone}.
             </s>
             <|user|>
-            Rewrite the following text: {text}
+            """
+    after = """
             </s>
             <|assistant|>
         """
+    return prefix, after
+
+def _build_prompt(text: str, tone: str) -> str:
+    prefix, after = _prompt_parts(tone)
+    return prefix + _REQUEST + text + after
+
+# tone -> (prefix input_ids, past_key_values of the prefix)
+_PREFIX_CACHE = {}
+_PREFIX_CACHE_LOCK = threading.Lock()
+
+def _prefix_cache(tone: str) -> tuple:
+    """Encodes a tone's prompt prefix once and keeps its KV cache for every later request."""
+    with _PREFIX_CACHE_LOCK:
+        entry = _PREFIX_CACHE.get(tone)
+        if entry is None:
+            prefix, _ = _prompt_parts(tone)
+            prefix_ids = MISTRAL_TOKENIZER(prefix, return_tensors="pt")["input_ids"].to(MISTRAL_DEVICE)
+            with span("rewrite.prefix_encode"), torch.no_grad():
+                past = MISTRAL_MODEL(input_ids=prefix_ids, use_cache=True).past_key_values
+            entry = (prefix_ids, past)
+            _PREFIX_CACHE[tone] = entry
+        return entry
+
+def _expand_cache(past, batch: int):
+    """A private copy of a prefix cache, repeated for each row of the batch (generate() mutates it)."""
+    past = copy.deepcopy(past)
+    if batch == 1:
+        return past
+    if hasattr(past, "batch_repeat_interleave"):
+        past.batch_repeat_interleave(batch)
+        return past
+    return tuple(tuple(t.repeat_interleave(batch, dim=0) for t in layer) for layer in past)
+
+def _prompt_inputs(chunks: list, tone: str) -> dict:
+    """
+    generate() inputs for a batch of chunks. With the prompt cache on, the
+    cached prefix is shared by every row and only the request text is
+    tokenized; rows are padded between the prefix and the text, and the
+    attention mask keeps positions contiguous.
+    """
+    if not LLM_PROMPT_CACHE:
+        inputs = MISTRAL_TOKENIZER([_build_prompt(chunk, tone) for chunk in chunks], return_tensors="pt", padding=True)
+        return {k: v.to(MISTRAL_DEVICE) for k, v in inputs.items()}
+
+    prefix_ids, past = _prefix_cache(tone)
+    _, after = _prompt_parts(tone)
+    suffixes = MISTRAL_TOKENIZER(
+        [_REQUEST + chunk + after for chunk in chunks],
+        return_tensors="pt", padding=True, add_special_tokens=False,
+    )
+    prefix = prefix_ids.expand(len(chunks), -1)
+    return {
+        "input_ids": torch.cat([prefix, suffixes["input_ids"].to(MISTRAL_DEVICE)], dim=1),
+        "attention_mask": torch.cat([torch.ones_like(prefix), suffixes["attention_mask"].to(MISTRAL_DEVICE)], dim=1),
+        "past_key_values": _expand_cache(past, len(chunks)),
+    }
+
+def _llm_token_length(text: str) -> int:
+    return len(MISTRAL_TOKENIZER(text, add_special_tokens=False)["input_ids"])
+
+def chunk_for_llm(text: str, max_tokens: int = LLM_CHUNK_TOKENS) -> list:
+    """
+    Splits text on paragraph, then sentence, then word boundaries and greedily
+    packs the pieces into chunks of at most max_tokens prompt tokens.
+    Paragraphs that share a chunk keep their blank-line separator.
+    """
+    load_llm()
+
+    pieces = []
+    for paragraph in _PARAGRAPH_RE.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if _llm_token_length(paragraph) <= max_tokens:
+            pieces.append((paragraph, True))
+            continue
+        sentences = [s for s in _SENTENCE_RE.split(paragraph) if s.strip()]
+        for i, sentence in enumerate(sentences):
+            if _llm_token_length(sentence) > max_tokens:
+                words = sentence.split()
+                step = max(1, len(words) * max_tokens // _llm_token_length(sentence))
+                parts = [" ".join(words[j:j + step]) for j in range(0, len(words), step)]
+            else:
+                parts = [sentence]
+            for j, part in enumerate(parts):
+                pieces.append((part, i == 0 and j == 0))
+
+    chunks = []
+    current, current_len = "", 0
+    for piece, starts_paragraph in pieces:
+        piece_len = _llm_token_length(piece)
+        if current and current_len + piece_len > max_tokens:
+            chunks.append(current)
+            current, current_len = "", 0
+        if current:
+            current += ("\n\n" if starts_paragraph else " ") + piece
+        else:
+            current = piece
+        current_len += piece_len
+    if current:
+        chunks.append(current)
+    return chunks
+
+class ThroughputEstimate:
+    """Rolling (exponentially weighted) generate() decode rate in steps per second."""
+    def __init__(self, alpha: float = 0.3):
+        self.alpha = alpha
+        self.rate = None
+        self._lock = threading.Lock()
+
+    def update(self, steps: int, seconds: float) -> None:
+        if steps <= 0 or seconds <= 0:
+            return
+        sample = steps / seconds
+        with self._lock:
+            self.rate = sample if self.rate is None else self.alpha * sample + (1 - self.alpha) * self.rate
+
+    def seconds_for(self, steps: int) -> float:
+        """Predicted time for a number of decode steps; 0.0 until the first measurement."""
+        rate = self.rate
+        return steps / rate if rate else 0.0
+
+LLM_THROUGHPUT = ThroughputEstimate()
+
+class DeadlineCriteria(StoppingCriteria):
+    """Stops generation for every sequence once the wall-clock deadline has passed."""
+    def __init__(self, deadline: float):
+        self.deadline = deadline
+
+    def __call__(self, input_ids, scores, **kwargs):
+        expired = time.monotonic() >= self.deadline
+        return torch.full((input_ids.shape[0],), expired, dtype=torch.bool, device=input_ids.device)
+
+class CancelCriteria(StoppingCriteria):
+    """Stops generation for every sequence once the event is set (the consumer went away)."""
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+def _generation_kwargs(
+    chunks: list,
+    deadline: Optional[float] = None,
+    seed: Optional[int] = None,
+    cancel: Optional[threading.Event] = None,
+) -> dict:
+    """
+    Decoding settings shared by batched and streaming generation. Seeded rewrites
+    decode greedily instead of seeding torch's process-wide RNG, which other
+    threads (VITS noise, concurrent requests) draw from at the same time.
+    """
+    longest = max(_llm_token_length(chunk) for chunk in chunks)
+    kwargs = {
+        "max_new_tokens": min(LLM_MAX_NEW_TOKENS, max(128, 2 * longest)),
+        "pad_token_id": MISTRAL_TOKENIZER.pad_token_id,
+    }
+    if seed is None:
+        kwargs.update(do_sample=True, temperature=0.7, top_p=0.9)
+    else:
+        kwargs["do_sample"] = False
+    criteria = []
+    if deadline is not None:
+        criteria.append(DeadlineCriteria(deadline))
+    if cancel is not None:
+        criteria.append(CancelCriteria(cancel))
+    if criteria:
+        kwargs["stopping_criteria"] = StoppingCriteriaList(criteria)
+    return kwargs
+
+def _expected_seconds(chunks: list) -> float:
+    """Predicted generate() time for one batch: its longest expected output at the measured rate."""
+    steps = max(min(LLM_MAX_NEW_TOKENS, int(_llm_token_length(chunk) * LLM_OUTPUT_RATIO)) for chunk in chunks)
+    return LLM_THROUGHPUT.seconds_for(steps)
+
+def _stop_token_ids() -> set:
+    eos = MISTRAL_MODEL.generation_config.eos_token_id
+    ids = set(eos if isinstance(eos, (list, tuple)) else [eos])
+    ids.add(MISTRAL_TOKENIZER.eos_token_id)
+    ids.discard(None)
+    return ids
+
+def _rule_rewrite_chunk(chunk: str, tone: str, seed: Optional[int]) -> str:
+    """Rule-based stand-in for an LLM chunk, keeping its paragraph breaks."""
+    paragraphs = [p for p in _PARAGRAPH_RE.split(chunk) if p.strip()]
+    with span("rewrite.rules"):
+        return "\n\n".join(rule_based_rewriter.rewrite_text(p, tone, seed=seed) for p in paragraphs)
+
+def rewrite_deadline(budget_s: Optional[float] = None) -> Optional[float]:
+    """
+    Absolute time.monotonic() deadline for a rewrite request (None = unbounded).
+    Callers that rewrite one request in several calls create it once and pass
+    it to each call, so the calls share a single budget.
+    """
+    budget_s = LLM_LATENCY_BUDGET_S if budget_s is None else budget_s
+    return time.monotonic() + budget_s if budget_s > 0 else None
+
+def _over_budget(chunks: list, deadline: Optional[float]) -> bool:
+    """True if the chunks, batched as rewrite_with_llm batches them, are predicted to miss the deadline."""
+    if deadline is None:
+        return False
+    predicted = sum(
+        _expected_seconds(chunks[start:start + LLM_BATCH_SIZE])
+        for start in range(0, len(chunks), LLM_BATCH_SIZE)
+    )
+    return time.monotonic() + predicted > deadline
+
+def _generate_batch(chunks: list, tone: str, deadline: Optional[float] = None, seed: Optional[int] = None) -> list:
+    """
+    Rewrites a list of chunks with one padded generate() call. Chunks whose
+    generation was cut off by the deadline come back as None.
+    """
+    inputs = _prompt_inputs(chunks, tone)
+
+    start = time.monotonic()
+    with span("rewrite.generate"), torch.no_grad():
+        outputs = MISTRAL_MODEL.generate(**inputs, **_generation_kwargs(chunks, deadline, seed))
+    new_tokens = outputs[:, inputs["input_ids"].shape[1]:]
+    LLM_THROUGHPUT.update(new_tokens.shape[1], time.monotonic() - start)
+
+    cut = deadline is not None and time.monotonic() >= deadline
+    stop_ids = _stop_token_ids() if cut else set()
+    results = []
+    for tokens in new_tokens:
+        if cut and not any(int(t) in stop_ids for t in tokens):
+            results.append(None)
+        else:
+            results.append(MISTRAL_TOKENIZER.decode(tokens, skip_special_tokens=True).strip())
+    return results
+
+def rewrite_with_llm(
+    text: str,
+    tone: str,
+    seed: Optional[int] = None,
+    budget_s: Optional[float] = None,
+    status: Optional[dict] = None,
+    deadline: Optional[float] = None,
+) -> str:
+    """
+    LLM-based rewriting function using the configured backend (see llm_backends).
+    Long texts are split into paragraph/sentence chunks that are rewritten in
+    padded batches and joined back in order, so nothing is cut off.
+    With a seed, decoding is greedy (see _generation_kwargs) and the
+    rule-based fallback uses the seed, so the output is reproducible.
+
+    The rewrite is held to a latency budget (budget_s, default
+    LLM_LATENCY_BUDGET_S), or to a shared deadline from rewrite_deadline().
+    If the measured decode rate predicts the text will not fit, or a batch runs
+    into the deadline, the remaining chunks are rewritten by the rule-based
+    rewriter instead and status["degraded"] is set.
+    """
+    if not text.strip():
+        return ""
+
+    try:
+        load_llm()
+        if deadline is None:
+            deadline = rewrite_deadline(budget_s)
+        with span("rewrite.tokenize"):
+            chunks = chunk_for_llm(text)
         
-        inputs = MISTRAL_TOKENIZER(prompt_template, return_tensors="pt")
-        inputs = {k: v.to(MISTRAL_DEVICE) for k, v in inputs.items()}
-        
-        with torch.no_grad():
-            outputs = MISTRAL_MODEL.generate(
-                **inputs,
-                max_new_tokens=512,
-                do_sample=True,
-                temperature=0.7,
-                top_p=0.9,
-                pad_token_id=MISTRAL_TOKENIZER.eos_token_id
-            )
+        degraded = _over_budget(chunks, deadline)
+        if degraded:
+            print("LLM rewrite would exceed the latency budget; using rule-based rewriter...")
         
-        rewritten_text = MISTRAL_TOKENIZER.decode(outputs[0], skip_special_tokens=True)
-        response_text = rewritten_text.split("<|assistant|>")[-1].strip()
+        rewritten = []
+        for start in range(0, len(chunks), LLM_BATCH_SIZE):
+            batch = chunks[start:start + LLM_BATCH_SIZE]
+            if deadline is not None and not degraded and time.monotonic() + _expected_seconds(batch) > deadline:
+                print("LLM rewrite ran out of latency budget; finishing with rule-based rewriter...")
+                degraded = True
+            results = [None] * len(batch) if degraded else _generate_batch(batch, tone, deadline, seed)
+            for chunk, result in zip(batch, results):
+                if result is None:
+                    degraded = True
+                    result = _rule_rewrite_chunk(chunk, tone, seed)
+                rewritten.append(result)
         
-        return response_text
+        if status is not None:
+            status["degraded"] = degraded
+        return "\n\n".join(part for part in rewritten if part)
 
     except Exception as e:
-        print(f"Mistral model failed: {e}")
-        return "An error occurred during text rewriting. Please try again."
+        print(f"Rewriter model failed: {e}")
+        return LLM_ERROR_MESSAGE
+
+def rewrite_with_llm_stream(
+    text: str,
+    tone: str,
+    seed: Optional[int] = None,
+    budget_s: Optional[float] = None,
+    status: Optional[dict] = None,
+    deadline: Optional[float] = None,
+) -> Iterator[str]:
+    """
+    Streaming variant of rewrite_with_llm: yields decoded text pieces as tokens
+    are generated. Chunks are rewritten one at a time (a streamer follows a
+    single sequence), separated by blank lines as in rewrite_with_llm.
+    The latency budget applies between chunks only: streamed text cannot be
+    taken back, so a chunk that has started is generated to the end, and the
+    chunks after the deadline use the rule-based rewriter. Closing the
+    generator stops the running generate() call after its current token.
+    """
+    if not text.strip():
+        return
+
+    try:
+        load_llm()
+        if deadline is None:
+            deadline = rewrite_deadline(budget_s)
+        with span("rewrite.tokenize"):
+            chunks = chunk_for_llm(text)
+    except Exception as e:
+        print(f"Rewriter model failed: {e}")
+        yield LLM_ERROR_MESSAGE
+        return
+
+    degraded = _over_budget(chunks, deadline)
+    if degraded:
+        print("LLM rewrite would exceed the latency budget; using rule-based rewriter...")
+
+    for i, chunk in enumerate(chunks):
+        if i > 0:
+            yield "\n\n"
+        if deadline is not None and not degraded and time.monotonic() + _expected_seconds([chunk]) > deadline:
+            print("LLM rewrite ran out of latency budget; finishing with rule-based rewriter...")
+            degraded = True
+        if degraded:
+            yield _rule_rewrite_chunk(chunk, tone, seed)
+            continue
+
+        inputs = _prompt_inputs([chunk], tone)
+        streamer = TextIteratorStreamer(MISTRAL_TOKENIZER, skip_prompt=True, skip_special_tokens=True)
+        errors = []
+        steps = []
+        cancel = threading.Event()
+
+        def generate():
+            try:
+                with span("rewrite.generate"), torch.no_grad():
+                    outputs = MISTRAL_MODEL.generate(
+                        **inputs, streamer=streamer, **_generation_kwargs([chunk], None, seed, cancel)
+                    )
+                steps.append(outputs.shape[1] - inputs["input_ids"].shape[1])
+            except Exception as e:
+                errors.append(e)
+                streamer.end()
+
+        start = time.monotonic()
+        # The worker runs in this context so its span lands in the caller's trace.
+        worker = threading.Thread(target=contextvars.copy_context().run, args=(generate,), daemon=True)
+        worker.start()
+        try:
+            for piece in streamer:
+                if piece:
+                    yield piece
+        finally:
+            cancel.set()
+            worker.join()
+
+        if errors:
+            print(f"Rewriter model failed: {errors[0]}")
+            yield LLM_ERROR_MESSAGE
+            return
+        LLM_THROUGHPUT.update(steps[0], time.monotonic() - start)
+        if deadline is not None and time.monotonic() >= deadline:
+            degraded = True
+
+    if status is not None:
+        status["degraded"] = degraded
+
+def _rewrite_cache_key(text: str, tone: str, seed: int, backend: str) -> str:
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return make_key(text_hash, tone, seed, backend)
+
+def _cached_rewrite(text: str, tone: str, seed: Optional[int], backend: str, rewrite) -> str:
+    """
+    Memoizes seeded rewrites in memory and, if configured, on disk.
+    Unseeded rewrites are non-deterministic and bypass the cache.
+    """
+    if seed is None:
+        return rewrite()
+
+    key = _rewrite_cache_key(text, tone, seed, backend)
+    result = _cache_lookup(key)
+    if result is not None:
+        return result
+
+    result = rewrite()
+    _cache_store(key, result)
+    return result
+
+def _cache_lookup(key: str) -> Optional[str]:
+    result = REWRITE_CACHE.get(key)
+    if result is not None:
+        return result
+    if REWRITE_DISK_CACHE is not None:
+        data = REWRITE_DISK_CACHE.get(key)
+        if data is not None:
+            result = data.decode("utf-8")
+            REWRITE_CACHE.put(key, result)
+            return result
+    return None
+
+def _cache_store(key: str, result: str) -> None:
+    if result and LLM_ERROR_MESSAGE not in result:
+        REWRITE_CACHE.put(key, result)
+        if REWRITE_DISK_CACHE is not None:
+            REWRITE_DISK_CACHE.put(key, result.encode("utf-8"))
 
 # --- HYBRID REWRITE FUNCTION ---
 # This is the function that will be called by app.py
-def hybrid_rewrite(text: str, tone: str) -> str:
+@traced("rewrite")
+def hybrid_rewrite(text: str, tone: str, seed: Optional[int] = None, deadline: Optional[float] = None) -> str:
     """
     Chooses between the rule-based rewriter and the LLM rewriter.
+    Passing a seed makes the result deterministic and cacheable.
+    LLM rewrites that fell back to rules to meet the latency budget are not cached.
     """
     word_count = len(text.split())
     
-    if word_count < 50:
+    if word_count < LLM_MIN_WORDS:
         # Use the rule-based system for short, simple texts
         print("Using rule-based rewriter...")
-        return rule_based_rewriter.rewrite_text(text, tone)
+        def rewrite():
+            with span("rewrite.rules"):
+                return rule_based_rewriter.rewrite_text(text, tone, seed=seed)
+        return _cached_rewrite(text, tone, seed, "rule", rewrite)
     else:
         # Use the LLM for longer, more complex texts
         print("Using LLM rewriter...")
-        return rewrite_with_llm(text, tone)
\ No newline at end of file
+        key = _rewrite_cache_key(text, tone, seed, f"llm:{LLM_BACKEND.name}:{MISTRAL_MODEL_ID}") if seed is not None else None
+        cached = _cache_lookup(key) if key else None
+        if cached is not None:
+            return cached
+
+        status = {}
+        result = rewrite_with_llm(text, tone, seed=seed, status=status, deadline=deadline)
+        if key and not status.get("degraded"):
+            _cache_store(key, result)
+        return result
+
+def hybrid_rewrite_stream(
+    text: str,
+    tone: str,
+    seed: Optional[int] = None,
+    deadline: Optional[float] = None,
+) -> Iterator[str]:
+    """
+    Streaming counterpart of hybrid_rewrite. Rule-based and cached results are
+    yielded whole; LLM rewrites are yielded piece by piece as they generate.
+    Pass a deadline from rewrite_deadline() to share one latency budget
+    across the segments of a longer request.
+    """
+    word_count = len(text.split())
+    backend = f"llm:{LLM_BACKEND.name}:{MISTRAL_MODEL_ID}"
+
+    if word_count < LLM_MIN_WORDS:
+        yield hybrid_rewrite(text, tone, seed)
+        return
+
+    key = _rewrite_cache_key(text, tone, seed, backend) if seed is not None else None
+    cached = _cache_lookup(key) if key else None
+    if cached is not None:
+        yield cached
+        return
+
+    print("Using LLM rewriter (streaming)...")
+    pieces = []
+    status = {}
+    stream = rewrite_with_llm_stream(text, tone, seed=seed, status=status, deadline=deadline)
+    try:
+        for piece in stream:
+            pieces.append(piece)
+            yield piece
+    finally:
+        stream.close()
+    if key and not status.get("degraded"):
+        _cache_store(key, "".join(pieces).strip())
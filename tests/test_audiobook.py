@@ -0,0 +1,121 @@
+import json
+
+import numpy as np
+import pytest
+
+import audiobook
+from audiobook import is_heading, iter_chapters
+from encoders import audio_duration, make_encoder
+
+
+@pytest.mark.parametrize("line", [
+    "Chapter 3: The Storm",
+    "CHAPTER IV.",
+    "chapter twenty-one",
+    "PART TWO",
+    "Book 2 - The Return",
+    "Prologue",
+    "Epilogue: Ten Years Later",
+    "# Title",
+])
+def test_is_heading(line):
+    assert is_heading(line)
+
+
+@pytest.mark.parametrize("line", [
+    "Chapter 3 was the longest one.",
+    "Part of the problem was the weather.",
+    "The prologue was short.",
+    "Chapter 1: " + "word " * 12,
+    "#hashtag",
+])
+def test_is_not_heading(line):
+    assert not is_heading(line)
+
+
+def test_iter_chapters_titles_and_opening():
+    lines = [
+        "A note before the book.\n", "\n",
+        "Chapter 1: Arrival\n", "\n",
+        "It was late.\n", "The train was later.\n", "\n",
+        "# Chapter Two\n",
+        "It rained.\n",
+    ]
+    assert list(iter_chapters(lines)) == [
+        ("Opening", "A note before the book."),
+        ("Chapter 1: Arrival", "It was late. The train was later."),
+        ("Chapter Two", "It rained."),
+    ]
+
+
+def test_iter_chapters_heading_must_start_a_paragraph():
+    lines = ["The book begins.\n", "Chapter 2\n", "is mentioned mid-paragraph.\n"]
+    assert list(iter_chapters(lines)) == [("Opening", "The book begins. Chapter 2 is mentioned mid-paragraph.")]
+
+
+def test_iter_chapters_splits_long_chapters_into_parts():
+    paragraph = " ".join(["word"] * 6)
+    lines = ["Prologue\n", "\n"] + [paragraph + "\n", "\n"] * 3
+    chapters = list(iter_chapters(lines, max_words=10))
+    assert [title for title, _ in chapters] == ["Prologue", "Prologue (part 2)"]
+    assert [len(text.split()) for _, text in chapters] == [12, 6]
+
+
+def mp3_bytes(seconds):
+    pytest.importorskip("lameenc")
+    encoder = make_encoder(16000, "mp3")
+    return encoder.encode(np.zeros(int(16000 * seconds), dtype=np.int16)) + encoder.flush()
+
+
+@pytest.fixture
+def fake_render(monkeypatch):
+    monkeypatch.setattr(audiobook, "AUDIO_FORMAT", "mp3")
+    monkeypatch.setattr(audiobook, "_model_ids", lambda: ("llm", "llm-model", "tts-model", "eager"))
+    calls, failing = [], set()
+
+    def render_chapter(text, tone, voice_label, seed, audio_path, text_path):
+        calls.append(text)
+        if text in failing:
+            raise RuntimeError("LLM rewrite failed")
+        text_path.write_text(text, encoding="utf-8")
+        audio_path.write_bytes(mp3_bytes(0.5))
+
+    monkeypatch.setattr(audiobook, "_render_chapter", render_chapter)
+    return calls, failing
+
+
+BOOK = "Chapter 1\n\nFirst text.\n\nChapter 2\n\nSecond text.\n\nChapter 3\n\nThird text.\n"
+
+
+def test_render_audiobook_resumes_without_reusing_failed_chapters(tmp_path, fake_render):
+    calls, failing = fake_render
+    failing.add("Second text.")
+
+    with pytest.raises(RuntimeError, match="1 of 3 chapters failed"):
+        audiobook.render_audiobook(BOOK, tmp_path, "Neutral", title="Book")
+
+    manifest = json.loads((tmp_path / audiobook.MANIFEST_NAME).read_text(encoding="utf-8"))
+    assert [entry["status"] for entry in manifest["chapters"]] == ["done", "failed", "done"]
+    assert manifest["combined"] is None
+    assert not (tmp_path / "book.mp3").exists()
+
+    calls.clear()
+    failing.clear()
+    manifest = audiobook.render_audiobook(BOOK, tmp_path, "Neutral", title="Book")
+
+    assert calls == ["Second text."]
+    assert [entry["status"] for entry in manifest["chapters"]] == ["done", "done", "done"]
+    assert manifest["combined"] == "book.mp3"
+    combined = (tmp_path / "book.mp3").read_bytes()
+    assert audio_duration(combined) == pytest.approx(sum(entry["duration_s"] for entry in manifest["chapters"]), abs=0.01)
+
+
+def test_render_audiobook_rerenders_after_a_model_change(tmp_path, fake_render, monkeypatch):
+    calls, _ = fake_render
+    audiobook.render_audiobook(BOOK, tmp_path, "Neutral")
+    calls.clear()
+
+    monkeypatch.setattr(audiobook, "_model_ids", lambda: ("llm", "other-model", "tts-model", "eager"))
+    audiobook.render_audiobook(BOOK, tmp_path, "Neutral")
+
+    assert calls == ["First text.", "Second text.", "Third text."]
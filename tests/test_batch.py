@@ -0,0 +1,51 @@
+import json
+from pathlib import Path
+
+from batch import _unique_name, discover
+
+
+def test_discover_directory_skips_rewritten_outputs(tmp_path):
+    (tmp_path / "sub").mkdir()
+    for name in ("b.txt", "a.txt", "sub/c.txt", "a.rewritten.txt", "notes.md"):
+        (tmp_path / name).write_text("text", encoding="utf-8")
+
+    items = discover(tmp_path, "Neutral", "VoiceA")
+
+    assert [(path.relative_to(tmp_path).as_posix(), name.as_posix()) for path, name, _, _ in items] == [
+        ("a.txt", "a.txt"), ("b.txt", "b.txt"), ("sub/c.txt", "sub/c.txt"),
+    ]
+
+
+def test_discover_manifest_keeps_outputs_inside_out_dir(tmp_path):
+    outside = tmp_path / "elsewhere" / "story.txt"
+    manifest = tmp_path / "books" / "list.txt"
+    manifest.parent.mkdir()
+    manifest.write_text(f"# comment\nstory.txt\n\n../elsewhere/story.txt\n{outside}\nparts/story.txt\n", encoding="utf-8")
+
+    items = discover(manifest, "Neutral", "VoiceA")
+
+    assert [path for path, _, _, _ in items] == [
+        manifest.parent / "story.txt",
+        manifest.parent / "../elsewhere/story.txt",
+        outside,
+        manifest.parent / "parts/story.txt",
+    ]
+    assert [name.as_posix() for _, name, _, _ in items] == ["story.txt", "story-2.txt", "story-3.txt", "parts/story.txt"]
+
+
+def test_discover_json_manifest_overrides_tone_and_voice(tmp_path):
+    manifest = tmp_path / "list.json"
+    manifest.write_text(json.dumps([{"path": "a.txt", "tone": "Suspenseful"}, {"path": "b.txt", "voice": "VoiceB"}]), encoding="utf-8")
+
+    items = discover(manifest, "Neutral", "VoiceA")
+
+    assert [(name.as_posix(), tone, voice) for _, name, tone, voice in items] == [
+        ("a.txt", "Suspenseful", "VoiceA"),
+        ("b.txt", "Neutral", "VoiceB"),
+    ]
+
+
+def test_unique_name_ignores_case_and_extension():
+    used = set()
+    names = [_unique_name(Path(name), used).as_posix() for name in ("a.txt", "A.txt", "a.md", "a-2.txt", "b/a.txt")]
+    assert names == ["a.txt", "A-2.txt", "a-3.md", "a-2-2.txt", "b/a.txt"]
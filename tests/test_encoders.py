@@ -0,0 +1,86 @@
+import struct
+import types
+
+import numpy as np
+import pytest
+
+import encoders
+
+
+class FakeOpus:
+    """Stands in for opuslib.Encoder: one packet per frame, sized so some need two lacing values."""
+
+    def __init__(self, fs, channels, application):
+        self.lookahead = fs // 160
+        self.bitrate = None
+        self.calls = 0
+
+    def encode(self, pcm, frame_size):
+        assert len(pcm) == 2 * frame_size
+        self.calls += 1
+        return bytes([self.calls % 256]) * (300 if self.calls % 7 == 0 else 60)
+
+
+@pytest.fixture
+def fake_opus(monkeypatch):
+    monkeypatch.setattr(encoders, "opuslib", types.SimpleNamespace(Encoder=FakeOpus), raising=False)
+
+
+def ogg_pages(data):
+    i = 0
+    while i < len(data):
+        assert data[i:i + 4] == b"OggS"
+        segments = data[i + 26]
+        end = i + 27 + segments + sum(data[i + 27:i + 27 + segments])
+        yield data[i:end]
+        i = end
+
+
+def encode_stream(chunks, sample_rate=16000):
+    encoder = encoders.OggOpusEncoder(sample_rate, 24)
+    return b"".join(encoder.encode(np.zeros(n, dtype=np.int16)) for n in chunks) + encoder.flush()
+
+
+def mp3_stream(seconds, sample_rate=16000):
+    pytest.importorskip("lameenc")
+    encoder = encoders.make_encoder(sample_rate, "mp3")
+    return encoder.encode(np.zeros(int(sample_rate * seconds), dtype=np.int16)) + encoder.flush()
+
+
+def test_mp3_duration_of_one_stream():
+    # The encoder adds its delay and pads to whole 36 ms frames.
+    assert encoders.audio_duration(mp3_stream(1.5), "mp3") == pytest.approx(1.5, abs=0.1)
+
+
+def test_mp3_duration_of_concatenated_streams_with_id3_tag():
+    from audiobook import id3_chapter_tag
+
+    streams = [mp3_stream(seconds) for seconds in (0.4, 1.0, 2.3)]
+    tag = id3_chapter_tag("Book", [{"title": "One", "duration_s": 1.0}])
+    total = sum(encoders.audio_duration(stream, "mp3") for stream in streams)
+    assert encoders.audio_duration(tag + b"".join(streams), "mp3") == pytest.approx(total)
+
+
+def test_unknown_format_has_no_duration():
+    assert encoders.audio_duration(b"data", "wav") == 0.0
+
+
+def test_ogg_opus_pages_have_valid_checksums(fake_opus):
+    data = encode_stream([16000 * 3 + 17])
+    pages = list(ogg_pages(data))
+    assert pages[0][5] == 0x02 and pages[-1][5] == 0x04
+    for page in pages:
+        blank = page[:22] + b"\0\0\0\0" + page[26:]
+        assert struct.unpack_from("<I", page, 22)[0] == encoders._ogg_crc(blank)
+    assert [struct.unpack_from("<I", page, 18)[0] for page in pages] == list(range(len(pages)))
+
+
+@pytest.mark.parametrize("sample_rate", [16000, 24000])
+def test_ogg_opus_duration_trims_delay_and_padding(fake_opus, sample_rate):
+    data = encode_stream([1000, sample_rate, 333], sample_rate)
+    assert encoders.audio_duration(data, "opus") == pytest.approx((1333 + sample_rate) / sample_rate)
+
+
+def test_ogg_opus_chained_streams_add_up(fake_opus):
+    data = encode_stream([8000]) + encode_stream([]) + encode_stream([4321])
+    assert encoders.audio_duration(data, "opus") == pytest.approx(12321 / 16000)
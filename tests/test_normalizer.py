@@ -0,0 +1,109 @@
+import random
+
+import pytest
+
+from normalizer import TextNormalizer, default_normalizer
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("$12.50", "twelve dollars and fifty cents"),
+    ("$1", "one dollar"),
+    ("$0.05", "five cents"),
+    ("£1,250", "one thousand, two hundred and fifty pounds"),
+    ("€3.5", "three euros and fifty cents"),
+])
+def test_currency(text, expected):
+    assert default_normalizer.normalize(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("3.14", "three point one four"),
+    ("0.5", "zero point five"),
+    ("42%", "forty-two percent"),
+    ("2.5%", "two point five percent"),
+    ("it costs 2.5.", "it costs two point five."),
+])
+def test_decimals_and_percentages(text, expected):
+    assert default_normalizer.normalize(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("2.5kg", "two point five kg"),
+    ("a 3.5mm jack", "a three point five mm jack"),
+    ("10kg", "ten kg"),
+    ("1,250km", "one thousand, two hundred and fifty km"),
+    ("$2.5M deal", "two point five million dollars deal"),
+    ("£1.2bn", "one point two billion pounds"),
+    ("$3.50.", "three dollars and fifty cents."),
+])
+def test_numbers_followed_by_units(text, expected):
+    assert default_normalizer.normalize(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1st", "first"),
+    ("2nd", "second"),
+    ("3rd", "third"),
+    ("21st", "twenty-first"),
+    ("100th", "one hundredth"),
+])
+def test_ordinals(text, expected):
+    assert default_normalizer.normalize(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("in 1999", "in nineteen ninety-nine"),
+    ("Since 1984", "Since nineteen eighty-four"),
+    ("by 2010", "by twenty ten"),
+    ("June 1944", "June nineteen forty-four"),
+    ("44 BC", "forty-four BC"),
+    ("1066 AD", "ten sixty-six AD"),
+    ("AD 1066", "AD ten sixty-six"),
+    ("the 1990s", "the nineteen nineties"),
+])
+def test_years_in_context(text, expected):
+    assert default_normalizer.normalize(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("2048 bytes", "two thousand and forty-eight bytes"),
+    ("1234 items", "one thousand, two hundred and thirty-four items"),
+    ("main 1999", "main one thousand, nine hundred and ninety-nine"),
+    ("1,250", "one thousand, two hundred and fifty"),
+    ("7", "seven"),
+])
+def test_numbers_outside_year_context_are_cardinals(text, expected):
+    assert default_normalizer.normalize(text) == expected
+
+
+def test_abbreviations_ampersand_and_whitespace():
+    text = "  Mr. Smith &  Dr. Jones\n\nmet Mrs. Lee on Main St. "
+    assert default_normalizer.normalize(text) == "Mister Smith and Doctor Jones met Missus Lee on Main Street"
+
+
+def test_add_rule_takes_precedence():
+    normalizer = TextNormalizer()
+    normalizer.add_rule(r"\bNo\.\s?(?=\d)", lambda token: "number ")
+    assert normalizer.normalize("No. 5") == "number five"
+
+
+def test_normalize_stream_matches_normalize():
+    text = (
+        "In 1999, Mr. Smith paid $12.50 & tipped 15% on a $2.5M deal for 3.5mm jacks.\n\n"
+        "By 2010 the 3rd edition had 2048 pages; AD 1066 and 44 BC were cited.\n"
+        "Since  1984 prices rose 2.5% a year — see the 1990s.   Dr. Lee lives on Main St. "
+    ) * 3
+    expected = default_normalizer.normalize(text)
+    rng = random.Random(0)
+    for _ in range(200):
+        chunks, i = [], 0
+        while i < len(text):
+            size = rng.randint(1, 24)
+            chunks.append(text[i:i + size])
+            i += size
+        assert "".join(default_normalizer.normalize_stream(chunks)) == expected
+
+
+def test_normalize_stream_by_lines():
+    text = "Chapter 1\n\nIn\n1999 it cost $3.\nJune\n1944 was 44\nBC.\n"
+    assert "".join(default_normalizer.normalize_stream(text.splitlines(keepends=True))) == default_normalizer.normalize(text)
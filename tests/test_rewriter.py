@@ -0,0 +1,79 @@
+import queue
+import time
+import types
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+import rewriter
+
+
+class FakeStreamer:
+    def __init__(self, tokenizer, **kwargs):
+        self.queue = queue.Queue()
+
+    def put(self, text):
+        self.queue.put(text)
+
+    def end(self):
+        self.queue.put(None)
+
+    def __iter__(self):
+        while (text := self.queue.get()) is not None:
+            yield text
+
+
+class SlowModel:
+    """Streams one word at a time, checking the stopping criteria after each word like generate()."""
+
+    def __init__(self, outputs, delay):
+        self.outputs = list(outputs)
+        self.delay = delay
+
+    def generate(self, input_ids, streamer, stopping_criteria=(), **kwargs):
+        words = self.outputs.pop(0).split()
+        ids = input_ids
+        for i, word in enumerate(words):
+            streamer.put(word if i == 0 else " " + word)
+            ids = torch.cat([ids, torch.zeros((1, 1), dtype=torch.long)], dim=1)
+            time.sleep(self.delay)
+            if any(bool(criterion(ids, None).all()) for criterion in stopping_criteria):
+                break
+        streamer.end()
+        return ids
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    monkeypatch.setattr(rewriter, "load_llm", lambda: None)
+    monkeypatch.setattr(rewriter, "chunk_for_llm", lambda text: ["first chunk", "second chunk"])
+    monkeypatch.setattr(rewriter, "_prompt_inputs", lambda chunks, tone: {"input_ids": torch.zeros((1, 3), dtype=torch.long)})
+    monkeypatch.setattr(rewriter, "_llm_token_length", lambda text: len(text.split()))
+    monkeypatch.setattr(rewriter, "_expected_seconds", lambda chunks: 0.0)
+    monkeypatch.setattr(rewriter, "_rule_rewrite_chunk", lambda chunk, tone, seed: f"<rules: {chunk}>")
+    monkeypatch.setattr(rewriter, "TextIteratorStreamer", FakeStreamer)
+    monkeypatch.setattr(rewriter, "MISTRAL_TOKENIZER", types.SimpleNamespace(pad_token_id=0))
+    monkeypatch.setattr(rewriter, "LLM_THROUGHPUT", rewriter.ThroughputEstimate())
+
+
+def test_stream_finishes_the_chunk_running_at_the_deadline(fake_llm, monkeypatch):
+    monkeypatch.setattr(rewriter, "MISTRAL_MODEL", SlowModel(["the whole first rewrite", "never used"], delay=0.05))
+    status = {}
+    deadline = time.monotonic() + 0.08
+
+    text = "".join(rewriter.rewrite_with_llm_stream("source", "Neutral", seed=1, status=status, deadline=deadline))
+
+    assert text == "the whole first rewrite\n\n<rules: second chunk>"
+    assert status["degraded"]
+
+
+def test_stream_within_budget_is_not_degraded(fake_llm, monkeypatch):
+    monkeypatch.setattr(rewriter, "MISTRAL_MODEL", SlowModel(["one", "two"], delay=0.0))
+    status = {}
+
+    text = "".join(rewriter.rewrite_with_llm_stream("source", "Neutral", seed=1, status=status, deadline=time.monotonic() + 60))
+
+    assert text == "one\n\ntwo"
+    assert not status["degraded"]
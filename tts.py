@@ -4,15 +4,27 @@ import io
 import json
 import tempfile
 from pathlib import Path
-from typing import Optional
+from concurrent.futures import Future
+from typing import Iterator, Optional
 import requests
-from pydub import AudioSegment, effects
+from pydub import AudioSegment
 from dotenv import load_dotenv
-from num2words import num2words
 from transformers import VitsModel, AutoTokenizer
 import torch
-import scipy
+import numpy as np
 import re
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from audio_processing import RunningPeakNormalizer, postprocess
+from batching import MicroBatcher
+from cache import DiskCache, make_key
+from encoders import AUDIO_FORMAT, audio_extension, make_encoder
+from metrics import TRACER, span, traced
+from normalizer import default_normalizer
+from tts_backends import TTS_BACKENDS, check_parity, prepare_backend
 
 try:
     import pyttsx3
@@ -24,136 +36,486 @@ except Exception:
 HF_TOKENIZER = None
 HF_MODEL = None
 HF_DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+HF_MODEL_ID = "facebook/mms-tts-eng"
+TTS_BACKEND = os.environ.get("ECHOVERSE_TTS_BACKEND", "eager")  # eager | int8 | compile
+TTS_PARITY_CHECK = os.environ.get("ECHOVERSE_TTS_PARITY_CHECK", "1") != "0"
+_HF_LOAD_LOCK = threading.Lock()
 
 # -------- Config & helpers --------
 _TARGET_SR = 16000
-_MAX_CHARS = 6000
+_MAX_CHUNK_TOKENS = 400   # tokenizer ids per chunk (MMS tokenizer interleaves blanks, ~2 ids per char)
+_BATCH_SIZE = 8           # chunks per padded forward pass
+_CHUNK_PAUSE_S = 0.12     # silence inserted between joined chunks
+
+_SENTENCE_RE = re.compile(r'(?<=[.!?…;:])\s+')
+_CLAUSE_RE = re.compile(r'(?<=[,])\s+')
 
 HF_VOICE_MAP = {
     "VoiceA": "eng"
 }
 
-def _normalize_to_mp3(seg: AudioSegment, out_path: Path) -> Path:
-    """Normalize, convert to mono + target SR, export to MP3."""
-    seg = seg.set_channels(1).set_frame_rate(_TARGET_SR)
-    seg = effects.normalize(seg)
-    out_path = out_path.with_suffix(".mp3")
-    seg.export(out_path.as_posix(), format="mp3")
-    return out_path
+# -------- Audio cache --------
+AUDIO_CACHE = DiskCache(
+    os.environ.get("ECHOVERSE_AUDIO_CACHE_DIR", "outputs/cache"),
+    max_bytes=int(os.environ.get("ECHOVERSE_AUDIO_CACHE_MAX_BYTES", 512 * 1024 * 1024)),
+    suffix=".audio",
+)
+
+def audio_cache_key(preprocessed_text: str, voice_label: str, rate_factor: float, variant: str = "file") -> str:
+    """
+    variant tells renderings of the same text apart: "file" (synthesize_bytes,
+    normalized as a whole), "stream" (encoded chunk by chunk with a running
+    peak) and "stream+pause" (a pipeline segment that starts with a pause).
+    The configured inference backend is part of the key, since int8 and
+    compiled models render slightly differently from eager.
+    """
+    return make_key(
+        preprocessed_text, voice_label, float(rate_factor),
+        HF_MODEL_ID, TTS_BACKEND, _TARGET_SR, AUDIO_FORMAT, variant,
+    )
+
+class WaveformEncoder:
+    """
+    Incremental encoder for model waveforms: each waveform is down-mixed,
+    resampled and normalized in NumPy, then fed to one AudioEncoder stream.
+    Normalization follows the running peak of the stream, so loudness does
+    not jump between chunks; a single waveform is peak-normalized as a whole.
+    """
+    def __init__(self):
+        self._encoder = make_encoder(_TARGET_SR)
+        self._normalize = RunningPeakNormalizer()
+
+    def encode(self, wav: np.ndarray, sample_rate: int) -> bytes:
+        with span("tts.encode"):
+            return self._encoder.encode(postprocess(wav, sample_rate, _TARGET_SR, normalization=self._normalize))
+
+    def flush(self) -> bytes:
+        with span("tts.encode"):
+            return self._encoder.flush()
+
+    def close(self) -> None:
+        self._encoder.close()
+
+def encode_audio(wav: np.ndarray, sample_rate: int) -> bytes:
+    """Post-process a waveform and encode it as one complete file."""
+    encoder = WaveformEncoder()
+    try:
+        return encoder.encode(wav, sample_rate) + encoder.flush()
+    finally:
+        encoder.close()
+
+def _encode_segment(seg: AudioSegment) -> bytes:
+    """Encode a pydub segment (offline fallback, silence) through the same NumPy post-processing."""
+    seg = seg.set_sample_width(2)
+    samples = np.frombuffer(seg.raw_data, dtype=np.int16).reshape(-1, seg.channels)
+    return encode_audio(samples, seg.frame_rate)
 
 # -------- Text Pre-processing --------
 def preprocess_text(text: str) -> str:
     """
     Cleans and normalizes text, including numbers, for better TTS pronunciation.
+    Delegates to the compiled single-pass normalizer (see normalizer.py).
     """
-    text = re.sub(r'(\d+)', lambda x: num2words(int(x.group(1))), text)
-    text = text.replace('St.', 'Street')
-    text = text.replace('Mr.', 'Mister')
-    text = text.replace('Dr.', 'Doctor')
-    text = text.replace('&', ' and ')
-    text = ' '.join(text.split())
-    return text
+    with span("tts.normalize"):
+        return default_normalizer.normalize(text)
 
 # -------- Hugging Face TTS --------
-def synthesize_hf(text: str) -> Optional[Path]:
+def load_hf_model() -> None:
+    """Loads the VITS model once; safe to call from a warm-up thread."""
     global HF_TOKENIZER, HF_MODEL
-    
-    try:
+
+    if HF_TOKENIZER is not None:
+        return
+    with _HF_LOAD_LOCK:
         if HF_TOKENIZER is None:
             print("Loading Hugging Face VITS model for the first time. This may take a moment...")
-            HF_MODEL = VitsModel.from_pretrained("facebook/mms-tts-eng").to(HF_DEVICE)
-            HF_TOKENIZER = AutoTokenizer.from_pretrained("facebook/mms-tts-eng")
+            with span("tts.model_load"):
+                model = VitsModel.from_pretrained(HF_MODEL_ID).to(HF_DEVICE)
+                model.eval()
+                tokenizer = AutoTokenizer.from_pretrained(HF_MODEL_ID)
+                HF_MODEL = _select_backend(model, tokenizer)
+            HF_TOKENIZER = tokenizer
 
-        inputs = HF_TOKENIZER(text=text, return_tensors="pt")
-        inputs = inputs.to(HF_DEVICE)
-        
-        with torch.no_grad():
-            outputs = HF_MODEL(**inputs).waveform
-        
-        wav_path = Path(tempfile.gettempdir()) / f"mms_speech_{os.getpid()}.wav"
-        scipy.io.wavfile.write(wav_path, rate=HF_MODEL.config.sampling_rate, data=outputs.cpu().numpy().squeeze())
+def _select_backend(model, tokenizer):
+    """
+    Applies the configured inference backend. Non-eager backends are checked
+    against the eager model first and discarded if they do not match.
+    """
+    if TTS_BACKEND not in TTS_BACKENDS or TTS_BACKEND == "eager":
+        return model
+    try:
+        candidate = prepare_backend(model, TTS_BACKEND, HF_DEVICE)
+        if candidate is model or not TTS_PARITY_CHECK:
+            return candidate
+        report = check_parity(model, candidate, tokenizer, HF_DEVICE)
+        print(f"TTS backend '{TTS_BACKEND}' parity check: {report}")
+        if not report["ok"]:
+            print("TTS backend output diverges from eager; using eager.")
+            return model
+        return candidate
+    except Exception as e:
+        print(f"TTS backend '{TTS_BACKEND}' unavailable: {e}; using eager.")
+        return model
 
-        return wav_path
+def _token_length(text: str) -> int:
+    return len(HF_TOKENIZER(text=text)["input_ids"])
 
-    except Exception as e:
-        print(f"Hugging Face TTS failed: {e}")
-        return None
+def _split_oversized(sentence: str, max_tokens: int) -> list[str]:
+    """Break a sentence that exceeds max_tokens at commas, then at word boundaries."""
+    pieces = []
+    for clause in _CLAUSE_RE.split(sentence):
+        if _token_length(clause) <= max_tokens:
+            pieces.append(clause)
+            continue
+        current = []
+        for word in clause.split():
+            if current and _token_length(" ".join(current + [word])) > max_tokens:
+                pieces.append(" ".join(current))
+                current = []
+            current.append(word)
+        if current:
+            pieces.append(" ".join(current))
+    return pieces
 
-# -------- Fallback (pyttsx3 offline) --------
-def _fallback_pyttsx3_to_mp3(text: str, voice_label: str, rate_factor: float = 1.0) -> Optional[Path]:
-    if not _HAS_PYTTXS3:
-        return None
+def chunk_text(text: str, max_tokens: int = _MAX_CHUNK_TOKENS) -> list[str]:
+    """
+    Splits preprocessed text at sentence boundaries and greedily packs sentences
+    into chunks whose tokenized length stays within max_tokens.
+    """
+    load_hf_model()
 
+    chunks = []
+    current, current_len = [], 0
+    for sentence in _SENTENCE_RE.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        length = _token_length(sentence)
+        pieces = [(sentence, length)]
+        if length > max_tokens:
+            pieces = [(p, _token_length(p)) for p in _split_oversized(sentence, max_tokens)]
+        for piece, piece_len in pieces:
+            if current and current_len + piece_len > max_tokens:
+                chunks.append(" ".join(current))
+                current, current_len = [], 0
+            current.append(piece)
+            current_len += piece_len
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+def _synthesize_batch(chunks: list[str]) -> list[np.ndarray]:
+    """Runs one padded forward pass and trims each waveform to its predicted length."""
+    inputs = HF_TOKENIZER(text=chunks, padding=True, return_tensors="pt")
+    inputs = inputs.to(HF_DEVICE)
+
+    with torch.inference_mode():
+        outputs = HF_MODEL(**inputs)
+
+    waveforms = outputs.waveform.cpu().numpy()
+    lengths = outputs.sequence_lengths.cpu().numpy()
+    return [waveforms[i, :int(lengths[i])] for i in range(len(chunks))]
+
+# Chunks from concurrent requests are merged into shared padded forward passes.
+VITS_BATCHER = MicroBatcher(
+    _synthesize_batch,
+    max_batch=int(os.environ.get("ECHOVERSE_VITS_MAX_BATCH", _BATCH_SIZE)),
+    max_latency_ms=float(os.environ.get("ECHOVERSE_VITS_MAX_LATENCY_MS", 5)),
+)
+TRACER.register_gauges("vits_batcher", VITS_BATCHER.stats)
+
+# -------- Process-pool synthesis --------
+# With more than one process, long documents are sharded across worker
+# processes, each holding its own model and a fixed slice of the CPU threads.
+TTS_PROCESSES = int(os.environ.get("ECHOVERSE_TTS_PROCESSES", 0))
+_PROCESS_POOL = None
+_PROCESS_POOL_LOCK = threading.Lock()
+
+def _init_worker(num_threads: int) -> None:
+    """Pins the worker's torch thread budget and loads the model once per process."""
+    torch.set_num_threads(num_threads)
     try:
-        engine = pyttsx3.init()
-        
-        voices = engine.getProperty('voices')
-        if "VoiceA" in voice_label and len(voices) > 0:
-            engine.setProperty('voice', voices[0].id)
-        elif "VoiceB" in voice_label and len(voices) > 1:
-            engine.setProperty('voice', voices[1].id)
-        
-        base_rate = engine.getProperty("rate") or 180
-        engine.setProperty("rate", int(base_rate * max(0.6, min(rate_factor, 1.6))))
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+    load_hf_model()
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _PROCESS_POOL
+
+    with _PROCESS_POOL_LOCK:
+        if _PROCESS_POOL is None:
+            threads = max(1, (os.cpu_count() or 1) // TTS_PROCESSES)
+            _PROCESS_POOL = ProcessPoolExecutor(
+                max_workers=TTS_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(threads,),
+            )
+        return _PROCESS_POOL
+
+def _synthesize_sharded(batches: list[list[str]]) -> Iterator[list[np.ndarray]]:
+    """Submits every padded batch to the process pool; results are yielded in submission order."""
+    return _get_process_pool().map(_synthesize_batch, batches)
+
+def _render_batches(batches: list[list[str]]) -> Iterator[list[np.ndarray]]:
+    """
+    Waveforms for each padded batch, in order: sharded across the process pool
+    when one is configured, otherwise merged with other requests' chunks by the
+    micro-batcher. Both run VITS outside this thread, so the tts.vits span
+    (time spent waiting for each batch) is recorded here, in the request's trace.
+    """
+    if TTS_PROCESSES > 1 and len(batches) > 1:
+        results = _synthesize_sharded(batches)
+    else:
+        results = (VITS_BATCHER.run(batch) for batch in batches)
+    for _ in batches:
+        with span("tts.vits"):
+            wavs = next(results)
+        yield wavs
+
+def synthesize_waveform(text: str) -> np.ndarray:
+    """
+    Renders text of any length: chunks are grouped by similar token length into
+    padded batches, and the waveforms are joined back in reading order.
+    """
+    load_hf_model()
+
+    chunks = chunk_text(text)
+    if not chunks:
+        return np.zeros(0, dtype=np.float32)
+
+    # Sorting by length keeps padding inside each batch small.
+    order = sorted(range(len(chunks)), key=lambda i: len(chunks[i]))
+    batch_ids = [order[start:start + _BATCH_SIZE] for start in range(0, len(order), _BATCH_SIZE)]
+    batches = [[chunks[i] for i in ids] for ids in batch_ids]
+
+    waveforms = [None] * len(chunks)
+    for ids, wavs in zip(batch_ids, _render_batches(batches)):
+        for i, wav in zip(ids, wavs):
+            waveforms[i] = wav
+
+    pause = np.zeros(int(HF_MODEL.config.sampling_rate * _CHUNK_PAUSE_S), dtype=np.float32)
+    joined = []
+    for i, wav in enumerate(waveforms):
+        if i > 0:
+            joined.append(pause)
+        joined.append(wav.astype(np.float32, copy=False))
+    return np.concatenate(joined)
+
+def iter_waveforms(chunks: list[str], leading_pause: bool = False) -> Iterator[np.ndarray]:
+    """
+    Yields one waveform per chunk in reading order. The first chunk is rendered
+    on its own so audio arrives early; the rest go through padded batches
+    (on the process pool, when configured, all submitted up front).
+    Each waveform after the first (or every one, with leading_pause) starts
+    with a short pause.
+    """
+    load_hf_model()
+
+    pause = np.zeros(int(HF_MODEL.config.sampling_rate * _CHUNK_PAUSE_S), dtype=np.float32)
+    batches = [chunks[:1]] + [chunks[i:i + _BATCH_SIZE] for i in range(1, len(chunks), _BATCH_SIZE)]
+    first = not leading_pause
+    for wavs in _render_batches(batches):
+        for wav in wavs:
+            wav = wav.astype(np.float32, copy=False)
+            yield wav if first else np.concatenate([pause, wav])
+            first = False
+
+# -------- Fallback (pyttsx3 offline) --------
+_PYTTSX3_TIMEOUT_S = 120  # max wait for one fallback rendering
+
+class Pyttsx3Worker:
+    """
+    Owns a single pyttsx3 engine on a dedicated thread, since engines are not
+    thread-safe. The engine is created and its voices resolved once; requests
+    arrive through a queue and are rendered one at a time. Each request returns
+    the rendered PCM as a pydub segment, so the caller encodes it exactly once.
+    """
+    def __init__(self):
+        self._jobs = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None:
+            with self._start_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._loop, name="pyttsx3-fallback", daemon=True)
+                    self._worker.start()
+
+    def render(self, text: str, voice_label: str, rate_factor: float = 1.0) -> AudioSegment:
+        self._ensure_worker()
+        future = Future()
+        self._jobs.put((text, voice_label, rate_factor, future))
+        return future.result(timeout=_PYTTSX3_TIMEOUT_S)
+
+    @staticmethod
+    def _resolve_voices(engine) -> dict:
+        voices = engine.getProperty('voices') or []
+        return {label: voices[i].id for i, label in enumerate(("VoiceA", "VoiceB")) if len(voices) > i}
+
+    def _loop(self) -> None:
+        try:
+            engine = pyttsx3.init()
+            voice_ids = self._resolve_voices(engine)
+            default_voice = engine.getProperty("voice")
+            base_rate = engine.getProperty("rate") or 180
+            error = None
+        except Exception as e:
+            error = e
 
         with tempfile.TemporaryDirectory() as tmpd:
             wav_path = Path(tmpd) / "speech.wav"
-            engine.save_to_file(text, wav_path.as_posix())
-            engine.runAndWait()
-
-            seg = AudioSegment.from_wav(wav_path.as_posix())
-            out_path = Path(tmpd) / "speech.mp3"
-            out_mp3 = _normalize_to_mp3(seg, out_path)
-
-            outputs = Path("outputs")
-            outputs.mkdir(parents=True, exist_ok=True)
-            final = outputs / "echoverse_tts.mp3"
-            AudioSegment.from_file(out_mp3.as_posix()).export(final.as_posix(), format="mp3")
-            return final
+            while True:
+                text, voice_label, rate_factor, future = self._jobs.get()
+                if error is not None:
+                    future.set_exception(error)
+                    continue
+                try:
+                    # Unknown labels get the default voice, not whatever the previous request set.
+                    voice_id = next((vid for label, vid in voice_ids.items() if label in voice_label), default_voice)
+                    if voice_id is not None:
+                        engine.setProperty('voice', voice_id)
+                    engine.setProperty("rate", int(base_rate * max(0.6, min(rate_factor, 1.6))))
+                    engine.save_to_file(text, wav_path.as_posix())
+                    engine.runAndWait()
+                    future.set_result(AudioSegment.from_wav(wav_path.as_posix()))
+                except Exception as e:
+                    future.set_exception(e)
+
+FALLBACK_WORKER = Pyttsx3Worker() if _HAS_PYTTXS3 else None
+
+def _fallback_pyttsx3(text: str, voice_label: str, rate_factor: float = 1.0) -> Optional[bytes]:
+    if FALLBACK_WORKER is None:
+        return None
+
+    try:
+        with span("tts.fallback"):
+            seg = FALLBACK_WORKER.render(text, voice_label, rate_factor)
+        return _encode_segment(seg)
     except Exception as e:
         print(f"pyttsx3 fallback failed: {e}")
         return None
 
 # -------- Public API --------
-def synthesize(
+class SynthesisError(RuntimeError):
+    """Raised when no TTS engine produced audio and a silent placeholder was not allowed."""
+
+@traced("tts")
+def synthesize_bytes(
     text: str,
     voice_label: str = "VoiceA",
     rate_factor: float = 1.0,
-) -> str:
+    allow_silence: bool = True,
+) -> bytes:
     """
-    Main entry point used by the app.
-    Prioritizes Hugging Face, then falls back to offline TTS.
+    In-memory entry point: returns encoded audio (ECHOVERSE_AUDIO_FORMAT, MP3 by
+    default) as bytes, going straight from the VITS waveform to an encoded
+    buffer with no intermediate files, so concurrent sessions never share
+    output paths.
+    Serves repeated requests from the audio cache, otherwise prioritizes
+    Hugging Face, then falls back to offline TTS. Only VITS output is cached,
+    so a transient VITS failure does not pin the fallback voice to the text.
+    If both fail, returns 1.5 s of silence, or raises SynthesisError when
+    allow_silence is False (offline renders that must not keep a silent file).
     """
     text = (text or "").strip()
     if not text:
         raise ValueError("No text provided for TTS.")
-    if len(text) > _MAX_CHARS:
-        text = text[:_MAX_CHARS] + " …"
-    
+
     preprocessed_text = preprocess_text(text)
-    
+
+    cache_key = audio_cache_key(preprocessed_text, voice_label, rate_factor)
+    cached = AUDIO_CACHE.get(cache_key)
+    if cached:
+        return cached
+
+    try:
+        audio = synthesize_waveform(preprocessed_text)
+        if audio.size:
+            data = encode_audio(audio, HF_MODEL.config.sampling_rate)
+            AUDIO_CACHE.put(cache_key, data)
+            return data
+    except Exception as e:
+        print(f"Hugging Face TTS failed: {e}")
+
+    print("Hugging Face failed or was not available, using offline fallback.")
+    data = _fallback_pyttsx3(preprocessed_text, voice_label=voice_label, rate_factor=rate_factor)
+    if data:
+        return data
+
+    if not allow_silence:
+        raise SynthesisError("TTS failed: neither VITS nor the offline fallback produced audio.")
+    try:
+        return _encode_segment(AudioSegment.silent(duration=1500))
+    except Exception as e:
+        raise RuntimeError(f"TTS failed, and silent fallback failed: {e}")
+
+@traced("tts.synthesize")
+def synthesize(
+    text: str,
+    voice_label: str = "VoiceA",
+    rate_factor: float = 1.0,
+) -> str:
+    """
+    File-based entry point: renders via synthesize_bytes and writes the result
+    to outputs/echoverse_tts.<ext>. Prefer synthesize_bytes for concurrent use.
+    """
+    data = synthesize_bytes(text, voice_label, rate_factor)
+
     outputs = Path("outputs")
     outputs.mkdir(parents=True, exist_ok=True)
-    final_path = outputs / "echoverse_tts.mp3"
+    final_path = outputs / f"echoverse_tts{audio_extension()}"
+    final_path.write_bytes(data)
+    return final_path.as_posix()
 
-    hf_path = synthesize_hf(preprocessed_text)
-    if hf_path and hf_path.is_file():
-        try:
-            seg = AudioSegment.from_wav(hf_path.as_posix())
-            _normalize_to_mp3(seg, final_path)
-            os.remove(hf_path)
-            return final_path.as_posix()
-        except Exception:
-            pass
-            
-    print("Hugging Face failed or was not available, using offline fallback.")
-    mp3_path = _fallback_pyttsx3_to_mp3(preprocessed_text, voice_label=voice_label, rate_factor=rate_factor)
-    if mp3_path:
-        return mp3_path.as_posix()
+def synthesize_stream(
+    text: str,
+    voice_label: str = "VoiceA",
+    rate_factor: float = 1.0,
+) -> Iterator[bytes]:
+    """
+    Streaming variant of synthesize: yields encoded audio in reading order as soon
+    as each chunk is rendered. The first chunk is rendered on its own so playback
+    can start early; the rest go through padded batches. All chunks feed one
+    incremental encoder, so b"".join(...) of everything yielded is a complete file.
+    Falls back to a single segment from synthesize_bytes() if VITS is unavailable.
+    """
+    text = (text or "").strip()
+    if not text:
+        raise ValueError("No text provided for TTS.")
+
+    preprocessed_text = preprocess_text(text)
+
+    cache_key = audio_cache_key(preprocessed_text, voice_label, rate_factor, variant="stream")
+    cached = AUDIO_CACHE.get(cache_key)
+    if cached:
+        yield cached
+        return
 
     try:
-        silence = AudioSegment.silent(duration=1500)
-        _normalize_to_mp3(silence, final_path)
-        return final_path.as_posix()
+        chunks = chunk_text(preprocessed_text)
     except Exception as e:
-        raise RuntimeError(f"TTS failed, and silent fallback failed: {e}")
\ No newline at end of file
+        print(f"Hugging Face TTS failed: {e}")
+        chunks = None
+
+    if chunks:
+        sample_rate = HF_MODEL.config.sampling_rate
+        # One encoder for the whole stream; it encodes while the next chunk renders.
+        encoder = WaveformEncoder()
+        segments = []
+        try:
+            for wav in iter_waveforms(chunks):
+                data = encoder.encode(wav, sample_rate)
+                if data:
+                    segments.append(data)
+                    yield data
+            segments.append(encoder.flush())
+            yield segments[-1]
+        finally:
+            encoder.close()
+        AUDIO_CACHE.put(cache_key, b"".join(segments))
+        return
+
+    yield synthesize_bytes(text, voice_label, rate_factor)
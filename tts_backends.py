@@ -0,0 +1,62 @@
+import numpy as np
+import torch
+
+# -------- Inference backends for the VITS model --------
+# "eager": fp32 module as loaded
+# "int8":  dynamic int8 quantization of the Linear layers (CPU only)
+# "compile": torch.compile graph with dynamic shapes
+TTS_BACKENDS = ("eager", "int8", "compile")
+
+PARITY_TEXT = "The quick brown fox jumps over the lazy dog, and then it rests in the shade."
+_PARITY_SEED = 1234
+_LENGTH_TOLERANCE = 0.05    # max relative difference in predicted duration
+_ENVELOPE_TOLERANCE = 0.25  # max normalized RMS difference of the energy envelopes
+_FRAME = 320                # envelope frame size in samples (20 ms at 16 kHz)
+
+def prepare_backend(model, backend: str, device: str):
+    """Returns the model wrapped or converted for the requested backend."""
+    if backend == "int8":
+        if device != "cpu":
+            print("int8 TTS backend is CPU-only; using eager.")
+            return model
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if backend == "compile":
+        return torch.compile(model, dynamic=True)
+    return model
+
+def _render(model, tokenizer, text: str, device: str) -> np.ndarray:
+    inputs = tokenizer(text=text, return_tensors="pt").to(device)
+    # Seed a forked RNG so the parity check leaves the process-wide generator
+    # (VITS noise, LLM sampling in other threads) as it found it.
+    target = torch.device(device)
+    devices = [target.index or 0] if target.type == "cuda" else []
+    with torch.random.fork_rng(devices=devices), torch.inference_mode():
+        torch.manual_seed(_PARITY_SEED)
+        outputs = model(**inputs)
+    length = int(outputs.sequence_lengths[0])
+    return outputs.waveform[0, :length].float().cpu().numpy()
+
+def _envelope(wav: np.ndarray) -> np.ndarray:
+    frames = wav[: len(wav) // _FRAME * _FRAME].reshape(-1, _FRAME)
+    return np.sqrt(np.mean(np.square(frames), axis=1))
+
+def check_parity(reference, candidate, tokenizer, device: str, text: str = PARITY_TEXT) -> dict:
+    """
+    Compares a backend against the eager model on the same seeded input.
+    VITS samples durations and noise, so raw samples are not comparable; the
+    check uses predicted length and the per-frame energy envelope instead.
+    """
+    ref = _render(reference, tokenizer, text, device)
+    out = _render(candidate, tokenizer, text, device)
+
+    length_diff = abs(len(out) - len(ref)) / max(len(ref), 1)
+    ref_env, out_env = _envelope(ref), _envelope(out)
+    n = min(len(ref_env), len(out_env))
+    scale = np.sqrt(np.mean(np.square(ref_env[:n]))) or 1.0
+    envelope_diff = float(np.sqrt(np.mean(np.square(ref_env[:n] - out_env[:n]))) / scale) if n else 1.0
+
+    return {
+        "length_diff": round(length_diff, 4),
+        "envelope_diff": round(envelope_diff, 4),
+        "ok": length_diff <= _LENGTH_TOLERANCE and envelope_diff <= _ENVELOPE_TOLERANCE,
+    }